@@ -1,3 +1,3 @@
-from .cli import main
+from .completion import entry
 
-main()
+entry()
@@ -0,0 +1,239 @@
+"""Python API for cfut
+
+The same operations as the command line, returning dataclasses instead of
+printing. Stack arguments are cfut aliases, or stack names if no such alias
+exists.
+
+    from cfut import api
+
+    api.configure("path/to/cfut.json", profile="dev")
+    for s in api.stack_statuses():
+        print(s.name, s.status)
+
+Errors, including a missing cfut.json, are raised as CfutError.
+
+Every function has an async variant with '_async' suffix that runs it in a
+worker thread, for gathering many calls concurrently.
+"""
+
+import asyncio
+import functools
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional
+
+from cfut import cache, commands, preflight
+from cfut.commands import CfutError, run_cli_parsed_output, run_concurrently
+from cfut.models import read_inifile
+
+
+@dataclass
+class StackStatus:
+    name: str
+    status: str
+
+
+@dataclass
+class StackInfo:
+    name: str
+    status: str
+    created: str
+    updated: Optional[str]
+    outputs: Dict[str, str]
+    parameters: Dict[str, str]
+
+
+@dataclass
+class StackResource:
+    logical_id: str
+    type: str
+    physical_id: Optional[str]
+    status: str
+
+
+@dataclass
+class EcrImage:
+    pushed_at: str
+    size_bytes: int
+    digest: str
+    tags: List[str]
+
+
+@dataclass
+class LogEvent:
+    timestamp: int
+    stream: str
+    message: str
+
+
+def configure(config_file: Optional[str] = None, profile: Optional[str] = None):
+    """use given cfut.json instead of the one in current directory, and profile
+
+    Template paths and local state (.cfut/) are then relative to the
+    directory of config_file, whatever the current directory is.
+    """
+    if config_file:
+        config_file = os.path.abspath(config_file)
+        commands.current_config = read_inifile(config_file)
+        cache.CACHE_DIR = os.path.join(os.path.dirname(config_file), ".cfut")
+    commands.set_profile(profile or commands.get_config().profile)
+
+
+def stack_statuses(stacks: Optional[List[str]] = None) -> List[StackStatus]:
+    """status of given stacks, default all in cfut.json. 'NOT_EXIST' if missing"""
+    ids = stacks if stacks is not None else list(commands.get_config().templates)
+    names = [commands.resolve_stack_name(i) for i in ids]
+    statuses = run_concurrently(commands.get_stack_status, names)
+    return [StackStatus(n, s) for n, s in zip(names, statuses)]
+
+
+def describe_stack(stack: str) -> StackInfo:
+    name = commands.resolve_stack_name(stack)
+    err, out = run_cli_parsed_output(["cloudformation", "describe-stacks", "--stack-name", name])
+    if err:
+        raise CfutError(f"Could not describe stack {name}: {err}")
+    s = out["Stacks"][0]
+    return StackInfo(
+        name=s["StackName"],
+        status=s["StackStatus"],
+        created=s["CreationTime"],
+        updated=s.get("LastUpdatedTime"),
+        outputs={o["OutputKey"]: o["OutputValue"] for o in s.get("Outputs", [])},
+        parameters={p["ParameterKey"]: p.get("ParameterValue") for p in s.get("Parameters", [])},
+    )
+
+
+def stack_resources(stack: str) -> List[StackResource]:
+    name = commands.resolve_stack_name(stack)
+    err, out = run_cli_parsed_output(
+        ["cloudformation", "list-stack-resources", "--stack-name", name]
+    )
+    if err:
+        raise CfutError(f"Could not list resources of {name}: {err}")
+    return [
+        StackResource(
+            r["LogicalResourceId"],
+            r["ResourceType"],
+            r.get("PhysicalResourceId"),
+            r["ResourceStatus"],
+        )
+        for r in out["StackResourceSummaries"]
+    ]
+
+
+def deploy(stacks: List[str], validate: bool = False) -> List[StackStatus]:
+    """create or update stacks in order, returns their final statuses
+
+    Progress is printed, as on the command line. Raises CfutError on failure.
+    With validate=True, all templates are validated before any stack is touched.
+    """
+    templates = [commands.lookup_stack(s) for s in stacks]
+    if validate:
+        preflight.validate_stacks(templates)
+    commands.deploy_stacks(templates)
+    return stack_statuses(stacks)
+
+
+def ecr_images(repo: Optional[str] = None) -> List[EcrImage]:
+    """images in repo, default ecr.repo of cfut.json, oldest first"""
+    if not repo:
+        ecr = commands.get_config().ecr
+        if not ecr:
+            raise CfutError("No repo given, and no 'ecr' section in cfut.json")
+        repo = ecr.repo
+    err, out = run_cli_parsed_output(["ecr", "describe-images", "--repository-name", repo])
+    if err:
+        raise CfutError(f"Could not list images in {repo}: {err}")
+    images = [
+        EcrImage(
+            pushed_at=d["imagePushedAt"],
+            size_bytes=int(d["imageSizeInBytes"]),
+            digest=d["imageDigest"],
+            tags=d.get("imageTags", []),
+        )
+        for d in out["imageDetails"]
+    ]
+    images.sort(key=lambda i: i.pushed_at)
+    return images
+
+
+def latest_log_stream(group: str) -> str:
+    err, out = run_cli_parsed_output(
+        [
+            "logs",
+            "describe-log-streams",
+            "--order-by",
+            "LastEventTime",
+            "--descending",
+            "--max-items",
+            "1",
+            "--log-group-name",
+            group,
+        ]
+    )
+    if err:
+        raise CfutError(f"Could not list log streams of {group}: {err}")
+    return out["logStreams"][0]["logStreamName"]
+
+
+def log_events(
+    group: Optional[str] = None,
+    stream: Optional[str] = None,
+    limit: Optional[int] = None,
+    tail: bool = False,
+) -> Iterator[LogEvent]:
+    """events of stream, default the newest stream of 'logs' in cfut.json
+
+    Pages are fetched as the iterator is consumed. Without limit, iterates
+    to the end of the stream. With tail=True, only the most recent page of
+    events is returned (like 'cfut logs').
+    """
+    group = group or commands.get_config().logs
+    if not group:
+        raise CfutError("No log group given, and no 'logs' in cfut.json")
+    stream = stream or latest_log_stream(group)
+    token = None
+    count = 0
+    while 1:
+        args = ["logs", "get-log-events", "--log-group-name", group, "--log-stream-name", stream]
+        if not tail:
+            args.append("--start-from-head")
+        if token:
+            args += ["--next-token", token]
+        err, out = run_cli_parsed_output(args)
+        if err:
+            raise CfutError(f"Could not read log stream {stream}: {err}")
+        for e in out["events"]:
+            yield LogEvent(e["timestamp"], stream, e["message"])
+            count += 1
+            if limit is not None and count >= limit:
+                return
+        if tail or not out["events"] or out["nextForwardToken"] == token:
+            return
+        token = out["nextForwardToken"]
+
+
+def _make_async(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+    wrapper.__name__ = func.__name__ + "_async"
+    return wrapper
+
+
+stack_statuses_async = _make_async(stack_statuses)
+describe_stack_async = _make_async(describe_stack)
+stack_resources_async = _make_async(stack_resources)
+deploy_async = _make_async(deploy)
+ecr_images_async = _make_async(ecr_images)
+
+
+async def log_events_async(
+    group: Optional[str] = None,
+    stream: Optional[str] = None,
+    limit: Optional[int] = None,
+    tail: bool = False,
+) -> List[LogEvent]:
+    """all events at once, see log_events"""
+    return await asyncio.to_thread(lambda: list(log_events(group, stream, limit, tail)))
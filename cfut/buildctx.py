@@ -0,0 +1,92 @@
+"""Content hash of a docker build context
+
+Files excluded by .dockerignore are left out, so the hash only changes when
+something that docker build would see changes.
+"""
+
+import hashlib
+import os
+import re
+import stat
+from typing import List, Optional, Tuple
+
+from cfut.cache import file_digest
+
+
+def read_dockerignore(src_dir: str) -> List[Tuple[bool, re.Pattern]]:
+    """[(is negation, pattern)] in file order"""
+    try:
+        with open(os.path.join(src_dir, ".dockerignore")) as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    rules = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        pattern = line[1:].strip() if negate else line
+        pattern = os.path.normpath(pattern).replace(os.sep, "/").lstrip("/")
+        rules.append((negate, pattern_to_regex(pattern)))
+    return rules
+
+
+def pattern_to_regex(pattern: str) -> re.Pattern:
+    """.dockerignore pattern => regex matching the path or anything under it"""
+    out = []
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if ch == "*":
+            out.append("[^/]*")
+        elif ch == "?":
+            out.append("[^/]")
+        else:
+            out.append(re.escape(ch))
+        i += 1
+    return re.compile("".join(out) + "(?:/.*)?")
+
+
+def is_ignored(path: str, rules: List[Tuple[bool, re.Pattern]]) -> bool:
+    ignored = False
+    for negate, regex in rules:
+        if regex.fullmatch(path):
+            ignored = not negate
+    return ignored
+
+
+def context_files(src_dir: str, dockerfile: Optional[str] = "Dockerfile") -> List[str]:
+    """relative paths of files sent to docker build, sorted"""
+    rules = read_dockerignore(src_dir)
+    can_prune = not any(negate for negate, _ in rules)
+    files = []
+    for root, dirs, names in os.walk(src_dir):
+        rel_root = os.path.relpath(root, src_dir).replace(os.sep, "/")
+        prefix = "" if rel_root == "." else rel_root + "/"
+        if can_prune:
+            dirs[:] = [d for d in dirs if not is_ignored(prefix + d, rules)]
+        for name in names:
+            rel = prefix + name
+            # docker always sends the Dockerfile, even if ignored
+            if rel == dockerfile or not is_ignored(rel, rules):
+                files.append(rel)
+    return sorted(files)
+
+
+def context_hash(src_dir: str) -> str:
+    """sha256 over paths, executable bits and contents of context files"""
+    h = hashlib.sha256()
+    for rel in context_files(src_dir):
+        full = os.path.join(src_dir, rel)
+        executable = bool(os.stat(full).st_mode & stat.S_IXUSR)
+        h.update(f"{rel}\0{int(executable)}\0{file_digest(full)}\n".encode())
+    return h.hexdigest()
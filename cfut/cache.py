@@ -0,0 +1,39 @@
+"""Local cache files, kept in .cfut/ next to cfut.json"""
+
+import hashlib
+import json
+import os
+from typing import Any
+
+CACHE_DIR = ".cfut"
+
+
+def cache_path(name: str) -> str:
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, name)
+
+
+def load_json(name: str, default: Any = None) -> Any:
+    try:
+        with open(cache_path(name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(name: str, data: Any):
+    """write atomically, concurrent readers never see a partial file"""
+    path = cache_path(name)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def file_digest(path: str) -> str:
+    """sha256 of file content"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
@@ -3,16 +3,33 @@ import dataclasses
 import itertools
 import json
 import os
+import shlex
 import sys
-from operator import itemgetter
+import time
+from contextlib import closing
+from datetime import datetime
 from pathlib import Path
-from typing import Optional, Tuple
-
-import yaml
-
-from cfut import commands
+from typing import List, Optional, Tuple
+
+from cfut import (
+    api,
+    buildctx,
+    commands,
+    completion,
+    dynamo,
+    history,
+    logarchive,
+    monitor,
+    preflight,
+    proc,
+    svcdeploy,
+    teardown,
+    watch,
+    whois,
+)
 from cfut.commands import (
     CONFIG_FILE,
+    CfutError,
     get_config,
     run_cf,
     OutputFormat,
@@ -21,7 +38,6 @@ from cfut.commands import (
     get_region,
     run_cli_parsed_output,
     run_cli,
-    get_stack_status,
 )
 from cfut.models import IniFile, CfnTemplate, EcrConfig, StatusRules, dump_inifile
 from cfut.dataclass_argparse import (
@@ -86,7 +102,7 @@ def lint(args):
     config = get_config()
     err = 0
     for t in config.templates.values():
-        ret = os.system("cfn-lint " + t.path)
+        ret = proc.run(["cfn-lint", t.path], capture=False).returncode
         if ret:
             err = ret
     if err:
@@ -97,9 +113,7 @@ def add_cloudformation_alias(fr: str, to: str, output: Optional[OutputFormat] =
     out = output if output else DEFAULT_OUTPUT_FORMAT
 
     def alias_handler(args):
-        cmd = to
-        if args.other_args:
-            cmd += " " + " ".join(args.other_args)
+        cmd = to.split() + args.other_args
         run_cf(cmd, out)
 
     sp = _sub(fr, alias_handler, help="Alias: " + to)
@@ -112,11 +126,7 @@ def add_any_alias(
     out = output if output else DEFAULT_OUTPUT_FORMAT
 
     def alias_handler(args):
-        cmd = to_cmd
-
-        if args.other_args:
-            cmd += " " + " ".join(args.other_args)
-
+        cmd = to_cmd.split() + args.other_args
         run_cli(family, cmd, out)
 
     sp = _sub(fr, alias_handler, help=f"Alias: {family} {to_cmd}")
@@ -185,11 +195,12 @@ def print_stacks():
         print(f"{k}: {v.path} => {v.name}")
 
 
-def c(s):
-    print(">", s)
-    ret = os.system(s)
+def c(argv: List[str]):
+    cmd = proc.format_argv(argv)
+    print(">", cmd)
+    ret = proc.run(argv, capture=False).returncode
     if ret:
-        raise Exception("ERROR! Command failed: " + s)
+        raise Exception("ERROR! Command failed: " + cmd)
 
 
 def get_ecr_address(ecr: EcrConfig) -> Tuple[str, str]:
@@ -208,67 +219,133 @@ def get_ecr_config_for_command(parsed: argparse.Namespace):
 
 def ecr_login(ecr: EcrConfig):
     ecr_address, region = get_ecr_address(ecr)
-    profile_arg = " ".join(commands.get_profile_arg()).strip()
-    c(
-        f'aws ecr {profile_arg} get-login-password --region {region} | docker login --password-stdin --username AWS "{ecr_address}"'
+    get_password = (
+        ["aws", "ecr"] + commands.get_profile_arg() + ["get-login-password", "--region", region]
     )
+    login = ["docker", "login", "--password-stdin", "--username", "AWS", ecr_address]
+    cmd = proc.format_argv(get_password) + " | " + proc.format_argv(login)
+    print(">", cmd)
+    if proc.run_pipe(get_password, login):
+        raise Exception("ERROR! Command failed: " + cmd)
+
+
+def ecr_repo_args(ecr: EcrConfig) -> List[str]:
+    _, region = get_ecr_address(ecr)
+    registry = ecr.account or get_account()
+    return ["--repository-name", ecr.repo, "--registry-id", registry, "--region", region]
+
+
+def get_ecr_manifest(ecr: EcrConfig, tag: str) -> Optional[Tuple[str, str]]:
+    """(manifest, media type) of image with tag, None if no such image"""
+    err, out = run_cli_parsed_output(
+        ["ecr", "batch-get-image"] + ecr_repo_args(ecr) + ["--image-ids", "imageTag=" + tag]
+    )
+    if err:
+        raise Exception(f"Could not read image {ecr.repo}:{tag}: {err}")
+    if not out["images"]:
+        return None
+    image = out["images"][0]
+    return image["imageManifest"], image.get("imageManifestMediaType", "")
+
+
+def put_ecr_tag(ecr: EcrConfig, manifest: str, media_type: str, tag: str):
+    """point tag at existing manifest, without pulling or pushing layers"""
+    media_args = ["--image-manifest-media-type", media_type] if media_type else []
+    err, _ = run_cli_parsed_output(
+        ["ecr", "put-image"]
+        + ecr_repo_args(ecr)
+        + ["--image-tag", tag, "--image-manifest", manifest]
+        + media_args
+    )
+    if err and "ImageAlreadyExistsException" not in err:
+        raise Exception(f"Could not tag {ecr.repo}:{tag}: {err}")
+    print(f"Tagged {ecr.repo}:{tag}")
 
 
 def do_ecr_push(args):
-    """push docker image to ecr"""
+    """push docker image to ecr
+
+    Images are also tagged with a hash of the build context. If an image with
+    that tag already exists, it is retagged in the registry instead of rebuilt.
+    """
     ecr = get_ecr_config_for_command(args)
-    ecr_login(ecr)
 
     repo_name = ecr.repo
     tag = ecr.tag
     src_dir = ecr.src
     ecr_address, _ = get_ecr_address(ecr)
     image_name = f"{ecr_address}/{repo_name}"
-    rev = "git-" + os.popen("git rev-parse HEAD").read().strip()[:8]
+    rev = "git-" + proc.run(["git", "rev-parse", "HEAD"]).stdout.decode().strip()[:8]
+    ctx = "ctx-" + buildctx.context_hash(src_dir)[:16]
+
+    if not getattr(args, "rebuild", False):
+        existing = get_ecr_manifest(ecr, ctx)
+        if existing:
+            print(f"Build context unchanged, image {image_name}:{ctx} exists")
+            manifest, media_type = existing
+            for t in [rev, tag, "latest"]:
+                put_ecr_tag(ecr, manifest, media_type, t)
+            return
 
+    ecr_login(ecr)
+    ctx_tag = f"{image_name}:{ctx}"
     rev_tag = f"{image_name}:{rev}" if rev else None
     config_tag = f"{image_name}:{tag}"
     latest_tag = f"{image_name}:latest"
 
-    tags = [t for t in [rev_tag, config_tag, latest_tag] if t]
-    tag_args = [f"-t " + tag for tag in tags]
-    c(f"docker build " + " ".join(tag_args) + " " + src_dir)
+    tags = [t for t in [ctx_tag, rev_tag, config_tag, latest_tag] if t]
+    tag_args = [a for tag in tags for a in ["-t", tag]]
+    cache_args = []
+    if ecr.cache_from:
+        # inline cache metadata makes pushed images usable as cache for later builds
+        cache_args = [
+            "--cache-from",
+            f"{image_name}:{ecr.cache_from}",
+            "--build-arg",
+            "BUILDKIT_INLINE_CACHE=1",
+        ]
+    c(["docker", "build"] + tag_args + cache_args + [src_dir])
 
     # agh, old docker client wants you to push every tag separately
     for t in tags:
-        c(f"docker push {t}")
+        c(["docker", "push", t])
 
 
 def do_dump_dynamo(args):
     table = args.table
 
-    err, out = run_cli_parsed_output("dynamodb scan --table-name " + table)
+    err, out = run_cli_parsed_output(["dynamodb", "scan", "--table-name", table])
     if err:
         print(err)
         return
 
-    simplified = [{k: list(it[k].values())[0] for k in it} for it in out["Items"]]
-    yamled = yaml.dump(simplified)
-    print(yamled)
+    print(dynamo.dump_items([dynamo.from_item(it) for it in out["Items"]]))
+
+
+def do_load_dynamo(args):
+    """load items from yaml, json or jsonl file to dynamodb table"""
+
+    def report(count: int, elapsed: float):
+        print(f"\r{count} items, {count / elapsed:.0f} items/s", end="", flush=True)
+
+    started = time.monotonic()
+    items = dynamo.read_items(args.file)
+    count = dynamo.load_table(args.table, items, workers=args.workers, report=report)
+    elapsed = time.monotonic() - started
+    print(f"\nLoaded {count} items to {args.table} in {elapsed:.1f}s")
 
 
 def do_ecr_ls(args):
     ecr = get_ecr_config_for_command(args)
     ecr_login(ecr)
-    repo_name = ecr.repo
-    err, parsed = run_cli_parsed_output(
-        f"ecr describe-images --repository-name {repo_name}"
-    )
-    lines = parsed["imageDetails"]
-    lines.sort(key=itemgetter("imagePushedAt"))
     table = [
         [
-            line["imagePushedAt"],
-            "%d MB" % (int(line["imageSizeInBytes"]) / (1024 * 1024)),
-            line["imageDigest"].split(":")[1],
-            ",".join(line.get("imageTags", [])),
+            image.pushed_at,
+            "%d MB" % (image.size_bytes / (1024 * 1024)),
+            image.digest.split(":")[1],
+            ",".join(image.tags),
         ]
-        for line in lines
+        for image in api.ecr_images(ecr.repo)
     ]
 
     for line in table:
@@ -282,22 +359,85 @@ def do_ecr_login(args):
 
 
 def do_stack_statuses(args):
+    for stack in api.stack_statuses():
+        print(f"{stack.name} {stack.status}")
+
+
+def do_whois(args):
+    """find stack owning a physical resource id, by exact id, prefix or substring"""
+    config = get_config()
+    index = whois.load_index(config.templates, refresh=args.refresh)
+    if not args.id:
+        return
+    owners = index.lookup(args.id)
+    if not owners:
+        print(f"No stack owns '{args.id}'. Try --refresh if the index is out of date")
+        return
+    for o in owners:
+        print("\t".join([o.physical_id, o.alias, o.stack, o.logical_id, o.type]))
+
+
+def do_delete_stacks(args):
+    """delete stacks, dependents first and independent ones concurrently"""
+    config = get_config()
+    if args.all:
+        names = [t.name for t in config.templates.values()]
+        resp = input(f"Delete {len(names)} stacks: {', '.join(names)} [y/n]? ")
+        if not resp.startswith("y"):
+            return
+    else:
+        ids = args.ids or ["default"]
+        names = [commands.resolve_stack_name(i) for i in ids]
+    teardown.delete_stacks(names)
+
+
+def do_watch(args):
+    """redeploy stacks when their templates change"""
     config = get_config()
-    for stack in config.templates.values():
-        status = get_stack_status(stack.name)
-        print(f"{stack.name} {status}")
+    ids = args.ids or list(config.templates)
+    stacks = {i: commands.lookup_stack(i) for i in ids}
+    try:
+        watch.StackWatch(stacks, cancel_in_flight=args.cancel).run()
+    except KeyboardInterrupt:
+        pass
+
+
+def do_monitor(args):
+    """live table of stacks, from one shared poller"""
+    if args.all:
+        names = None
+    else:
+        ids = args.ids or list(get_config().templates)
+        names = [commands.resolve_stack_name(i) for i in ids]
+    try:
+        monitor.Monitor(names).run(until_idle=args.until_idle)
+    except KeyboardInterrupt:
+        pass
+
+
+def do_history(args):
+    """p50/p95 durations of successful deploys per stack"""
+    stacks = [commands.resolve_stack_name(i) for i in args.ids]
+    with closing(history.connect()) as conn:
+        stats = history.deploy_stats(conn, stacks or None)
+    fmt = history.format_duration
+    print("\t".join(["stack", "operation", "count", "p50", "p95"]))
+    for stack, op, count, p50, p95 in stats:
+        print("\t".join([stack, op, str(count), fmt(p50), fmt(p95)]))
 
 
 def do_deploy_stack(args):
-    stack = commands.dispatch_stack_command(args)
-    commands.deploy_stack(stack)
+    stacks = commands.dispatch_stack_commands(args)
+    if args.validate:
+        preflight.validate_stacks(stacks)
+    commands.deploy_stacks(stacks)
 
 
 def do_taskdef_dump(args):
     cli_args = {"--task-definition": args.name}
 
-    call_args = " ".join(a + " " + b for (a, b) in cli_args.items())
-    err, out = run_cli_parsed_output("ecs describe-task-definition " + call_args)
+    call_args = [w for item in cli_args.items() for w in item]
+    err, out = run_cli_parsed_output(["ecs", "describe-task-definition"] + call_args)
     full_def = out["taskDefinition"]
     bad_props = [
         "taskDefinitionArn",
@@ -321,42 +461,58 @@ def do_taskdef_dump(args):
 
 
 def do_taskdef_load(args):
-    call_args = {"--cli-input-json": "file://" + args.file}
-    call_args = " ".join(a + " " + b for (a, b) in call_args.items())
-    command = "ecs register-task-definition " + call_args
-    print(">", command)
-    commands.run_cli("ecs", "register-task-definition " + call_args)
+    cli_args = {"--cli-input-json": "file://" + args.file}
+    call_args = [w for item in cli_args.items() for w in item]
+    command = ["ecs", "register-task-definition"] + call_args
+    print(">", proc.format_argv(command))
+    commands.run_cli("ecs", ["register-task-definition"] + call_args)
 
 
 def do_task_run(args):
-    call_args = {"--task-definition": args.name}
+    cli_args = {"--task-definition": args.name}
     config = get_config()
-    extra_args = " ".join(config.ecs.run_args)
-    call_args = " ".join(a + " " + b for (a, b) in call_args.items())
-    commands.run_cli("ecs", "run-task " + call_args + " " + extra_args)
+    # entries may hold several words, e.g. "--cluster my-cluster"
+    extra_args = [w for arg in config.ecs.run_args for w in shlex.split(arg)]
+    call_args = [w for item in cli_args.items() for w in item]
+    commands.run_cli("ecs", ["run-task"] + call_args + extra_args)
+
+
+def do_service_deploy(args):
+    """point ecs services to new task definition and wait for the rollout"""
+    config = get_config()
+    cluster = args.cluster or (config.ecs.cluster if config.ecs else None)
+    if not cluster:
+        print("No cluster, set ecs.cluster in cfut.json or use --cluster")
+        return
+    svcdeploy.deploy_services(cluster, args.services, args.taskdef, args.stall_timeout)
 
 
 def do_logs(args):
     logs = get_config().logs
-    err, cont = run_cli_parsed_output(
-        "logs describe-log-streams --order-by LastEventTime --descending --log-group-name "
-        + logs
-    )
-    stream = cont["logStreams"][0]["logStreamName"]
-    err, ret = run_cli_parsed_output(
-        f"logs get-log-events --log-group-name {logs} --log-stream-name {stream}"
-    )
-    print("\n".join(e["message"] for e in ret["events"]))
+    if args.action == "sync":
+        since = logarchive.parse_since(args.since) if args.since else None
+        count = logarchive.LogArchive(logs).sync(since)
+        print(f"Synced {count} new events from {logs}")
+        return
+    if args.action == "grep":
+        if not args.pattern:
+            print("Usage: cfut logs grep <pattern> [--since 1d]")
+            return
+        since = logarchive.parse_since(args.since) if args.since else 0
+        for ts, stream, message in logarchive.LogArchive(logs).grep(args.pattern, since):
+            stamp = datetime.fromtimestamp(ts / 1000).isoformat(timespec="milliseconds")
+            print(f"{stamp} {stream} {message.rstrip()}")
+        return
 
+    print("\n".join(e.message for e in api.log_events(logs, tail=True)))
 
-def main():
-    os.environ["AWS_PAGER"] = "less"
-    change_to_root_dir()
-    if len(sys.argv) == 1:
-        print("Run cfut -h to get help.")
-        print("Workspace:", os.getcwd())
-        print_stacks()
-        return
+
+def do_completion(args):
+    """print shell completion script, use e.g. eval "$(cfut completion bash)" """
+    print(completion.SCRIPTS[args.shell])
+
+
+def create_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser()
     _sub_init(parser)
     parser.add_argument("-p", "--profile", type=str, help="AWS profile to use")
@@ -385,7 +541,9 @@ def main():
         None,
         "StackResources[*].[LogicalResourceId,ResourceType,PhysicalResourceId]",
     )
-    add_id_cmd("delete", "delete-stack", commands.STATUS_RULES_DELETE)
+    delete = _sub("delete", do_delete_stacks, help="Delete stacks in dependency order")
+    delete.add_argument("ids", nargs="*", help="Nicknames of stacks")
+    delete.add_argument("--all", action="store_true", help="Delete all stacks in cfut.json")
 
     add_cloudformation_alias(
         "ls",
@@ -397,6 +555,9 @@ def main():
     ecrls = _sub("ecrls", do_ecr_ls, help="List images in ECR repository")
     ecrlogin = _sub("ecrlogin", do_ecr_login, help="Do docker login to ECR")
     add_overrider_args(push, EcrConfig)
+    push.add_argument(
+        "--rebuild", action="store_true", help="Build even if build context is unchanged"
+    )
     add_overrider_args(ecrls, EcrConfig)
     add_overrider_args(ecrlogin, EcrConfig)
 
@@ -405,15 +566,51 @@ def main():
     )
 
     ddump = _sub("ddump", do_dump_dynamo, help="Dump dynamodb table")
+    dload = _sub("dload", do_load_dynamo, help="Load items to dynamodb table")
+    dload.add_argument("table")
+    dload.add_argument("file", help="File with items, .yml, .json or .jsonl")
+    dload.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help=f"Concurrent writers. At most {proc.MAX_PROCESSES} aws processes run at a time",
+    )
 
     _sub("status", do_stack_statuses, help="Get status for all stacks")
 
+    history_cmd = _sub("history", do_history, help="Deploy durations from local history")
+    history_cmd.add_argument("ids", nargs="*", help="Aliases of stacks, default all")
+
+    watch_cmd = _sub("watch", do_watch, help="Redeploy stacks when templates change")
+    watch_cmd.add_argument("ids", nargs="*", help="Aliases of stacks, default all")
+    watch_cmd.add_argument(
+        "--cancel", action="store_true", help="Cancel in-flight update when template changes"
+    )
+
+    monitor_cmd = _sub("monitor", do_monitor, help="Live status of many stacks")
+    monitor_cmd.add_argument("ids", nargs="*", help="Aliases of stacks, default all")
+    monitor_cmd.add_argument("--all", action="store_true", help="All stacks in the account")
+    monitor_cmd.add_argument(
+        "--until-idle", action="store_true", help="Exit when no stack is in progress"
+    )
+
+    whois_cmd = _sub("whois", do_whois, help="Find the stack that owns a resource")
+    whois_cmd.add_argument("id", nargs="?", help="Physical resource id, prefix or substring")
+    whois_cmd.add_argument(
+        "--refresh", action="store_true", help="Update index for stacks changed since last run"
+    )
+
     deploy = _sub(
         "deploy",
         do_deploy_stack,
-        help="Create or update stack. Will delete ROLLBACK state stacks",
+        help="Create or update stacks in order. Will delete ROLLBACK state stacks",
+    )
+    commands.add_stack_command_args_to_parser(deploy, multiple=True)
+    deploy.add_argument(
+        "--validate",
+        action="store_true",
+        help="Validate all templates and their parameters before deploying any stack",
     )
-    commands.add_stack_command_args_to_parser(deploy)
     ddump.add_argument("table")
 
     add_any_alias("tdls", "ecs", "list-task-definitions", OutputFormat("yaml", ""))
@@ -428,11 +625,51 @@ def main():
 
     tdrun = _sub("tdrun", do_task_run, help="Run task in ECS")
     tdrun.add_argument("name")
-    _sub("logs", do_logs, help="Get logs")
+
+    svc = _sub("svcdeploy", do_service_deploy, help="Deploy ECS services and wait for rollout")
+    svc.add_argument("services", nargs="+")
+    svc.add_argument(
+        "--taskdef",
+        help="Task definition as family or family:revision. Default: latest of current family",
+    )
+    svc.add_argument("--cluster", help="Override ecs.cluster from cfut.json")
+    svc.add_argument(
+        "--stall-timeout",
+        type=int,
+        default=svcdeploy.DEFAULT_STALL_SECONDS,
+        help="Fail when rollout makes no progress for this many seconds",
+    )
+    logs = _sub("logs", do_logs, help="Get logs, or sync and search local log archive")
+    logs.add_argument("action", nargs="?", choices=["sync", "grep"])
+    logs.add_argument("pattern", nargs="?", help="Regular expression for grep")
+    logs.add_argument("--since", help="Time window, e.g. 30m, 12h, 2d")
+
+    comp = _sub("completion", do_completion, help="Print shell completion script")
+    comp.add_argument("shell", choices=sorted(completion.SCRIPTS))
+    return parser
+
+
+def main():
+    os.environ["AWS_PAGER"] = "less"
+    change_to_root_dir()
+    try:
+        get_config()
+    except CfutError as e:
+        print(e)
+        sys.exit(1)
+    if len(sys.argv) == 1:
+        print("Run cfut -h to get help.")
+        print("Workspace:", os.getcwd())
+        print_stacks()
+        return
+    parser = create_parser()
     parsed = parser.parse_args(sys.argv[1:])
     config = get_config()
     if parsed.define:
-        apply_config_overrides(config, parsed.define)
+        try:
+            apply_config_overrides(config, parsed.define)
+        except ValueError as e:
+            parser.error(str(e))
     commands.set_profile_from_config_or_parser(parsed)
     _dispatch(parsed)
 
@@ -1,30 +1,64 @@
 import argparse
 import json
 import os
+import sqlite3
 import subprocess
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 from dataclasses import dataclass
 from functools import lru_cache
-from typing import Optional, Dict, List, Tuple, Any, Union
-
-from cfut.models import IniFile, get_env, CfnTemplate, StatusRules, load_inifile
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from cfut import history, proc
+from cfut.models import CfnTemplate, IniFile, StatusRules, get_env, read_inifile
+from cfut.params import (
+    SOURCE_SECRET,
+    SOURCE_SSM,
+    SOURCE_STACK_OUTPUT,
+    LocalParameterStore,
+    ParamRef,
+    collect_refs,
+    resolve_parameters,
+    split_output_ref,
+)
 
 CONFIG_FILE = "cfut.json"
 
 ERROR_NO_UPDATES_TO_PERFORM = "No updates are to be performed"
 
+# threads used by run_concurrently, processes are also capped in proc.py
+MAX_WORKERS = 8
+
+# api limits for ssm get-parameters and secretsmanager batch-get-secret-value
+SSM_BATCH_SIZE = 10
+SECRETS_BATCH_SIZE = 20
+
+# values that must not be shown in printed command lines
+redacted_values: set = set()
+
+REDACTED = "****"
+
+
+def redact(text: str) -> str:
+    for value in redacted_values:
+        # also as escaped inside json, e.g. in --parameters
+        for form in (value, json.dumps(value)[1:-1]):
+            text = text.replace(form, REDACTED)
+    return text
+
 
 @dataclass
 class OutputFormat:
     style: str  # "yaml" | "table"
     query: Optional[str]
 
-    def as_arg(self):
+    def as_arg(self) -> List[str]:
         parts = ["--output", str(self.style)]
         if self.query:
             parts.extend(["--query", self.query])
-        return " ".join(parts)
+        return parts
 
 
 DEFAULT_OUTPUT_FORMAT = OutputFormat("json", None)
@@ -36,48 +70,48 @@ def get_profile_arg():
     return []
 
 
-def run_cli_parsed_output(cmd: str) -> Tuple[Optional[str], Any]:
-    """run command with right profile and json output, parse it
+def run_cli_parsed_output(args: List[str]) -> Tuple[Optional[str], Any]:
+    """run aws command with right profile and json output, parse it
+
+    args are the words after 'aws', e.g. ["cloudformation", "describe-stacks"]
 
     return (err, object)
     """
-    command = ["aws"] + get_profile_arg() + ["--output", "json", cmd]
-    full_cmd = " ".join(command)
-    p = subprocess.run(full_cmd, capture_output=True, text=True, shell=True)
+    command = ["aws"] + get_profile_arg() + ["--output", "json"] + args
+    p = proc.run(command)
     if p.returncode != 0:
         return p.stderr, None
-    out = p.stdout
-
-    parsed = json.loads(out)
+    # some commands print nothing on success
+    parsed = json.loads(p.stdout) if p.stdout.strip() else None
     return None, parsed
 
 
 def get_run_command(
-    family: str, subcommand: str, output: Optional[OutputFormat] = None
-) -> str:
+    family: str, subcommand: List[str], output: Optional[OutputFormat] = None
+) -> List[str]:
     out = (output if output else DEFAULT_OUTPUT_FORMAT).as_arg()
-    profile_arg = " ".join(get_profile_arg())
-    cmd = f"aws {family} {out} {profile_arg} {subcommand}"
-    return cmd
+    return ["aws", family] + out + get_profile_arg() + subcommand
 
 
-def run_cli(family: str, subcommand: str, output: Optional[OutputFormat] = None):
+def run_cli(family: str, subcommand: List[str], output: Optional[OutputFormat] = None):
     cmd = get_run_command(family, subcommand, output)
-    print("> " + cmd)
-    subprocess.check_call(cmd, shell=True)
+    print("> " + redact(proc.format_argv(cmd)))
+    ret = proc.run(cmd, capture=False)
+    if ret.returncode != 0:
+        raise subprocess.CalledProcessError(ret.returncode, redact(proc.format_argv(cmd)))
 
 
 def run_cli_safe(
     family: str,
-    subcommand: str,
+    subcommand: List[str],
     allowed_errors=[],
     output: Optional[OutputFormat] = None,
 ):
     cmd = get_run_command(family, subcommand, output)
-    print("> " + cmd)
+    print("> " + redact(proc.format_argv(cmd)))
 
-    ret = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    print(ret.stdout)
+    ret = proc.run(cmd)
+    print(ret.stdout.decode(errors="replace"))
     if ret.returncode == 0:
         return ""
     for err in allowed_errors:
@@ -85,12 +119,12 @@ def run_cli_safe(
             print("Allowed error:", err)
             return err
 
-    raise Exception(f"Command '{cmd}' failed: {ret.stderr}")
+    raise Exception(f"Command '{redact(proc.format_argv(cmd))}' failed: {ret.stderr}")
 
 
 def get_stack_status(stack_name: str) -> Union["NOT_EXIST"]:
     err, out = run_cli_parsed_output(
-        f"cloudformation describe-stacks --stack-name={stack_name}"
+        ["cloudformation", "describe-stacks", "--stack-name", stack_name]
     )
     if err:
         if "does not exist" in err:
@@ -99,23 +133,103 @@ def get_stack_status(stack_name: str) -> Union["NOT_EXIST"]:
     return out["Stacks"][0]["StackStatus"]
 
 
+# while polling, check stack events for slow resources every n polls
+SLOW_CHECK_EVERY = 5
+# resource is slow if it takes this many times its usual duration...
+SLOW_FACTOR = 3
+# ...and at least this many seconds
+SLOW_MIN_SECONDS = 60
+# polling starts after the operation has been submitted, include events from just before
+EVENT_SLACK_SECONDS = 10
+
+
+def get_stack_events(stack_name: str) -> List[Dict]:
+    """recent events of stack, newest first. Empty if stack is gone"""
+    err, out = run_cli_parsed_output(
+        [
+            "cloudformation",
+            "describe-stack-events",
+            "--stack-name",
+            stack_name,
+            "--max-items",
+            "500",
+        ]
+    )
+    if err:
+        return []
+    return out["StackEvents"]
+
+
+def warn_slow_resources(
+    stack_name: str, started: float, baselines: Dict[str, float], warned: set
+):
+    now = time.time()
+    events = get_stack_events(stack_name)
+    timings = history.resource_timings(events, stack_name, started - EVENT_SLACK_SECONDS)
+    for logical, typ, res_started, res_ended in timings:
+        if res_ended is not None or logical in warned or logical not in baselines:
+            continue
+        elapsed = now - res_started
+        usual = baselines[logical]
+        if elapsed > SLOW_MIN_SECONDS and elapsed > SLOW_FACTOR * usual:
+            warned.add(logical)
+            print(
+                f"SLOW: {logical} ({typ}) running {history.format_duration(elapsed)},"
+                f" usually {history.format_duration(usual)}"
+            )
+
+
+def record_history(stack_name: str, operation: str, started: float, status: str, ok: bool):
+    ended = time.time()
+    events = get_stack_events(stack_name)
+    timings = history.resource_timings(events, stack_name, started - EVENT_SLACK_SECONDS)
+    try:
+        with closing(history.connect()) as conn:
+            history.record_deploy(conn, stack_name, operation, started, ended, status, ok, timings)
+    except (sqlite3.Error, OSError) as e:
+        # history is advisory, a deploy that went through must not fail here
+        print(f"Could not record deploy history: {e}", file=sys.stderr)
+
+
 def poll_until_status(stack_name: str, statusrules: StatusRules):
+    operation = statusrules.in_progress.split("_")[0]
+    started = time.time()
+    try:
+        with closing(history.connect()) as conn:
+            expected = history.expected_duration(conn, stack_name, operation)
+            baselines = history.resource_baselines(conn, stack_name, operation)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Could not read deploy history: {e}", file=sys.stderr)
+        expected, baselines = None, {}
+    warned: set = set()
+    polls = 0
     while 1:
         status = get_stack_status(stack_name)
         if "IN_PROGRESS" in status or status == statusrules.in_progress:
-            print("Progress:", status)
+            elapsed = time.time() - started
+            note = history.format_duration(elapsed)
+            if expected:
+                eta = history.format_duration(max(0, expected - elapsed))
+                note += f", ETA {eta}" if elapsed < expected else ", taking longer than usual"
+            print("Progress:", status, f"({note})")
+            polls += 1
+            if baselines and polls % SLOW_CHECK_EVERY == 0:
+                warn_slow_resources(stack_name, started, baselines, warned)
             time.sleep(2)
             continue
         if status != statusrules.success:
+            record_history(stack_name, operation, started, status, False)
             raise_stack_failure(
                 stack_name,
                 f"Polling expected status {statusrules.success}, got {status}",
             )
         print("Complete:", status)
+        record_history(stack_name, operation, started, status, True)
+        forget_stack_outputs(stack_name)
         break
 
 
-def run_cf(cmd: str, output: Optional[OutputFormat] = None):
+def run_cf(cmd: List[str], output: Optional[OutputFormat] = None):
     return run_cli_safe("cloudformation", cmd, [ERROR_NO_UPDATES_TO_PERFORM], output)
 
 
@@ -145,51 +259,206 @@ def get_config():
     if current_config:
         return current_config
     if not os.path.isfile(CONFIG_FILE):
-        print(
+        raise CfutError(
             f"Config file '{CONFIG_FILE}' not found, please run 'cfut init' to create it"
         )
-        sys.exit(1)
 
-    current_config = load_inifile(open(CONFIG_FILE).read())
+    current_config = read_inifile(CONFIG_FILE)
 
     return current_config
 
 
-def make_param_arg(d: Dict[str, str]):
-    params = " ".join(f"ParameterKey={k},ParameterValue={v}" for (k, v) in d.items())
-    return f"--parameters {params}"
+def make_param_arg(d: Dict[str, str]) -> List[str]:
+    # json form, so that values may contain commas, spaces and quotes
+    params = [{"ParameterKey": k, "ParameterValue": v} for (k, v) in d.items()]
+    return ["--parameters", json.dumps(params)]
 
 
-def stack_args(stack_name: str, template_file: Optional[str]):
-    parts = [f"--stack-name {stack_name}"]
+def stack_args(stack_name: str, template_file: Optional[str]) -> List[str]:
+    parts = ["--stack-name", stack_name]
     if template_file:
-        parts.append(f"--template-body file://{template_file}")
-    return " ".join(parts)
+        parts.extend(["--template-body", "file://" + template_file])
+    return parts
 
 
-def base_command(command_name: str, stack_name: str, template_file: Optional[str]):
-    return f"{command_name} " + stack_args(stack_name, template_file)
+def base_command(
+    command_name: str, stack_name: str, template_file: Optional[str]
+) -> List[str]:
+    return [command_name] + stack_args(stack_name, template_file)
 
 
-def run_command(stack_id: str, command_name: str, output: OutputFormat) -> str:
-    """returns stack name"""
+def resolve_stack_name(stack_id: str) -> str:
     inifile = get_config()
     # if no alias exists, just pass it through
     stack = inifile.templates.get(stack_id)
-    stack_name = stack.name if stack else stack_id
+    return stack.name if stack else stack_id
+
+
+def run_command(stack_id: str, command_name: str, output: OutputFormat) -> str:
+    """returns stack name"""
+    stack_name = resolve_stack_name(stack_id)
     cmd = base_command(command_name, stack_name, None)
     run_cf(cmd, output)
     return stack_name
 
 
+def run_concurrently(func: Callable, items: Iterable) -> List:
+    """map func over items in a thread pool, results in input order"""
+    items = list(items)
+    if len(items) <= 1:
+        return [func(it) for it in items]
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+# outputs fetched during this run, by stack name
+stack_outputs_memo: Dict[str, Dict[str, str]] = {}
+
+
+def describe_stack_outputs(stack_name: str) -> Dict[str, str]:
+    err, out = run_cli_parsed_output(
+        ["cloudformation", "describe-stacks", "--stack-name", stack_name]
+    )
+    if err:
+        raise CfutError(f"Could not read outputs of stack {stack_name}: {err}")
+    outputs = out["Stacks"][0].get("Outputs", [])
+    return {o["OutputKey"]: o["OutputValue"] for o in outputs}
+
+
+def get_stack_outputs(stack_names: Iterable[str]) -> Dict[str, Dict[str, str]]:
+    """outputs of many stacks, missing ones fetched concurrently in one round"""
+    names = set(stack_names)
+    missing = sorted(names - stack_outputs_memo.keys())
+    for name, outputs in zip(missing, run_concurrently(describe_stack_outputs, missing)):
+        stack_outputs_memo[name] = outputs
+    return {name: stack_outputs_memo[name] for name in names}
+
+
+def forget_stack_outputs(stack_name: str):
+    """call when stack has changed, outputs will be fetched again on next use"""
+    stack_outputs_memo.pop(stack_name, None)
+
+
+def batches(items: List, size: int) -> List[List]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+class AwsParameterStore:
+    """Reads SSM parameters and Secrets Manager secrets with batched calls"""
+
+    def get_ssm_parameters(self, names: List[str]) -> Dict[str, Tuple[str, bool]]:
+        """name => (value, is SecureString)"""
+        err, out = run_cli_parsed_output(
+            ["ssm", "get-parameters", "--with-decryption", "--names"] + names
+        )
+        if err:
+            raise CfutError(f"Could not read SSM parameters: {err}")
+        return {p["Name"]: (p["Value"], p["Type"] == "SecureString") for p in out["Parameters"]}
+
+    def get_secrets(self, secret_ids: List[str]) -> Dict[str, str]:
+        err, out = run_cli_parsed_output(
+            ["secretsmanager", "batch-get-secret-value", "--secret-id-list"] + secret_ids
+        )
+        if err:
+            raise CfutError(f"Could not read secrets: {err}")
+        found = {}
+        for secret in out["SecretValues"]:
+            for secret_id in secret_ids:
+                if secret_id in (secret["Name"], secret["ARN"]):
+                    found[secret_id] = secret["SecretString"]
+        return found
+
+
+parameter_store: Union[AwsParameterStore, LocalParameterStore] = AwsParameterStore()
+
+
+def set_parameter_store(store: Union[AwsParameterStore, LocalParameterStore]):
+    global parameter_store
+    parameter_store = store
+    param_values_memo.clear()
+
+
+# ssm and secret values fetched during this run
+param_values_memo: Dict[ParamRef, str] = {}
+
+
+def fetch_store_values(refs: Iterable[ParamRef]):
+    """fetch missing ssm parameters and secrets to param_values_memo"""
+    missing = sorted((ref for ref in refs if ref not in param_values_memo), key=str)
+
+    def fetch_ssm(names: List[str]) -> Dict[ParamRef, Tuple[str, bool]]:
+        found = parameter_store.get_ssm_parameters(names)
+        return {ParamRef(SOURCE_SSM, name): v for name, v in found.items()}
+
+    def fetch_secrets(secret_ids: List[str]) -> Dict[ParamRef, Tuple[str, bool]]:
+        found = parameter_store.get_secrets(secret_ids)
+        return {ParamRef(SOURCE_SECRET, i): (value, True) for i, value in found.items()}
+
+    ssm_names = [ref.key for ref in missing if ref.source == SOURCE_SSM]
+    secret_ids = [ref.key for ref in missing if ref.source == SOURCE_SECRET]
+    fetches = [(fetch_ssm, b) for b in batches(ssm_names, SSM_BATCH_SIZE)] + [
+        (fetch_secrets, b) for b in batches(secret_ids, SECRETS_BATCH_SIZE)
+    ]
+    for found in run_concurrently(lambda fetch: fetch[0](fetch[1]), fetches):
+        for ref, (value, secure) in found.items():
+            if secure:
+                redacted_values.add(value)
+            param_values_memo[ref] = value
+
+    not_found = [ref for ref in missing if ref not in param_values_memo]
+    if not_found:
+        raise CfutError("Not found: " + ", ".join(f"{r.source} '{r.key}'" for r in not_found))
+
+
+def fetch_param_values(refs: Iterable[ParamRef]) -> Dict[ParamRef, str]:
+    refs = set(refs)
+    templates = get_config().templates
+    output_refs = {
+        ref: split_output_ref(ref, templates)
+        for ref in refs
+        if ref.source == SOURCE_STACK_OUTPUT
+    }
+    outputs = get_stack_outputs(stack_name for stack_name, _ in output_refs.values())
+    values = {}
+    for ref, (stack_name, key) in output_refs.items():
+        if key not in outputs[stack_name]:
+            raise CfutError(f"Stack {stack_name} has no output '{key}'")
+        values[ref] = outputs[stack_name][key]
+    store_refs = refs - output_refs.keys()
+    fetch_store_values(store_refs)
+    values.update((ref, param_values_memo[ref]) for ref in store_refs)
+    return values
+
+
+def prefetch_parameters(stacks: List[CfnTemplate]):
+    """fetch references of all stacks in a rollout in one batched round
+
+    Outputs of stacks that are part of the rollout are left out, because
+    they may change when that stack is deployed.
+    """
+    rolled_out = {stack.name for stack in stacks}
+    templates = get_config().templates
+    refs = [
+        ref
+        for ref in collect_refs(stacks)
+        if ref.source != SOURCE_STACK_OUTPUT
+        or split_output_ref(ref, templates)[0] not in rolled_out
+    ]
+    fetch_param_values(refs)
+
+
+def get_stack_parameters(stack: CfnTemplate) -> Dict[str, str]:
+    """parameters of stack with references resolved"""
+    values = fetch_param_values(collect_refs([stack]))
+    return resolve_parameters(stack.parameters, values)
+
+
 def run_stack(command_name: str, stack: CfnTemplate):
     cmd = base_command(command_name, stack.name, stack.path)
     if stack.capabilities:
-        caps = " --capabilities " + " ".join(c.name for c in stack.capabilities)
-        cmd += caps
+        cmd += ["--capabilities"] + [c.name for c in stack.capabilities]
     if stack.parameters:
-        params = make_param_arg(stack.parameters)
-        cmd += " " + params
+        cmd += make_param_arg(get_stack_parameters(stack))
 
     return run_cf(cmd)
 
@@ -217,8 +486,21 @@ def dispatch_stack_command(args: argparse.Namespace) -> CfnTemplate:
     return stack
 
 
-def add_stack_command_args_to_parser(sp: argparse.ArgumentParser):
-    sp.add_argument("id", help="Alias of stack", nargs="?")
+def dispatch_stack_commands(args: argparse.Namespace) -> List[CfnTemplate]:
+    """like dispatch_stack_command, for parsers created with multiple=True"""
+    ids = args.ids or ["default"]
+    if len(ids) == 1:
+        return [dispatch_stack_command(argparse.Namespace(**vars(args), id=ids[0]))]
+    if args.params or args.name:
+        raise CfutError("--params and --name can only be used with a single stack")
+    return [lookup_stack(idd) for idd in ids]
+
+
+def add_stack_command_args_to_parser(sp: argparse.ArgumentParser, multiple: bool = False):
+    if multiple:
+        sp.add_argument("ids", help="Aliases of stacks, handled in order", nargs="*")
+    else:
+        sp.add_argument("id", help="Alias of stack", nargs="?")
     sp.add_argument("--params", nargs="+", help="Params as key1=value1 key2=value2")
     sp.add_argument("--name", type=str, help="Override name of the stack")
 
@@ -274,15 +556,23 @@ def deploy_stack(stack: CfnTemplate):
     print(status)
 
 
+def deploy_stacks(stacks: List[CfnTemplate]):
+    prefetch_parameters(stacks)
+    for stack in stacks:
+        deploy_stack(stack)
+
+
 def run_command_with_file(stack_id: str, command_name: str):
     stack = lookup_stack(stack_id)
     run_stack(command_name, stack)
 
 
-def ccap(cmd: List[str]):
-    print(">", " ".join(cmd))
-    out = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
-    return out
+def ccap(cmd: List[str]) -> str:
+    print(">", proc.format_argv(cmd))
+    ret = proc.run(cmd)
+    if ret.returncode != 0:
+        raise subprocess.CalledProcessError(ret.returncode, cmd, ret.stdout, ret.stderr)
+    return ret.stdout.decode()
 
 
 @lru_cache()
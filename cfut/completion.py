@@ -0,0 +1,214 @@
+"""Shell completion
+
+Completing must be fast, so 'cfut __complete' is answered here before the
+rest of cfut (yaml, argparse, aws helpers) is imported. Candidates come from
+aliases in cfut.json and a cached list of live stack names, ECR repositories
+and task definition families. When the cache is older than CACHE_TTL, it is
+refreshed by a background process and the stale list is used meanwhile.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+COMPLETE_COMMAND = "__complete"
+CACHE_TTL = 300
+# don't start another refresh while one may still be running
+REFRESH_GRACE = 60
+
+CONFIG_FILE = "cfut.json"
+CACHE_FILE = os.path.join(".cfut", "completion.json")
+REFRESH_MARKER = os.path.join(".cfut", "completion.refreshing")
+
+STACKS = "stacks"
+REPOS = "repos"
+FAMILIES = "families"
+
+# subcommand => what its positional arguments are. Must match cli.create_parser
+COMMANDS: Dict[str, Optional[str]] = {
+    "lint": None,
+    "update": STACKS,
+    "create": STACKS,
+    "describe": STACKS,
+    "events": STACKS,
+    "res": STACKS,
+    "delete": STACKS,
+    "ls": None,
+    "ecrpush": None,
+    "ecrls": None,
+    "ecrlogin": None,
+    "dls": None,
+    "ddump": None,
+    "dload": None,
+    "status": None,
+    "history": STACKS,
+    "watch": STACKS,
+    "monitor": STACKS,
+    "whois": None,
+    "deploy": STACKS,
+    "tdls": None,
+    "tddump": FAMILIES,
+    "tdload": None,
+    "tdrun": FAMILIES,
+    "svcdeploy": None,
+    "logs": None,
+    "completion": None,
+}
+
+# option => what its value is
+OPTION_VALUES = {"--taskdef": FAMILIES}
+# options of cfut itself that take a value
+GLOBAL_OPTIONS = ("-p", "--profile", "-d", "--define")
+# -d key => what its value is
+DEFINE_VALUES = {"ecr.repo": REPOS}
+
+BASH_SCRIPT = """\
+_cfut_complete() {
+    COMPREPLY=($(cfut __complete "${COMP_LINE:0:COMP_POINT}" 2>/dev/null))
+}
+complete -o default -F _cfut_complete cfut"""
+
+SCRIPTS = {
+    "bash": BASH_SCRIPT,
+    "zsh": "autoload -U +X bashcompinit && bashcompinit\n" + BASH_SCRIPT,
+}
+
+
+def find_root() -> Optional[str]:
+    cur = os.getcwd()
+    while 1:
+        if os.path.isfile(os.path.join(cur, CONFIG_FILE)):
+            return cur
+        parent = os.path.dirname(cur)
+        if parent == cur:
+            return None
+        cur = parent
+
+
+def read_json(path: str) -> Optional[Dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_fresh(path: str, ttl: float) -> bool:
+    try:
+        return time.time() - os.stat(path).st_mtime < ttl
+    except OSError:
+        return False
+
+
+def start_refresh(root: str):
+    if is_fresh(os.path.join(root, REFRESH_MARKER), REFRESH_GRACE):
+        return
+    os.makedirs(os.path.join(root, ".cfut"), exist_ok=True)
+    with open(os.path.join(root, REFRESH_MARKER), "w"):
+        pass
+    subprocess.Popen(
+        [sys.executable, "-c", "from cfut.completion import refresh; refresh()"],
+        cwd=root,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def split_line(line: str) -> List[str]:
+    """words after 'cfut' in the command line up to cursor, last one is being completed"""
+    words = line.split()[1:]
+    if not line or line[-1].isspace():
+        words.append("")
+    return words
+
+
+def candidates(words: List[str], root: Optional[str]) -> List[str]:
+    prefix = words[-1] if words else ""
+    if prefix.startswith("-"):
+        return []
+    command = None
+    skip = False
+    for w in words[:-1]:
+        if skip or w.startswith("-"):
+            skip = w in GLOBAL_OPTIONS
+            continue
+        command = w
+        break
+    if command is None and not (words[:-1] and words[-2] in GLOBAL_OPTIONS):
+        return [c for c in COMMANDS if c.startswith(prefix)]
+
+    if len(words) > 1 and words[-2] in ("-d", "--define"):
+        # bash splits words at '=', so complete only the value
+        key, sep, prefix = prefix.partition("=")
+        kind = DEFINE_VALUES.get(key) if sep else None
+    else:
+        kind = OPTION_VALUES.get(words[-2]) if len(words) > 1 else None
+        kind = kind or COMMANDS.get(command or "")
+    if not kind or not root:
+        return []
+
+    cache_path = os.path.join(root, CACHE_FILE)
+    if not is_fresh(cache_path, CACHE_TTL):
+        start_refresh(root)
+    cache = read_json(cache_path) or {}
+    found = list(cache.get(kind, []))
+    if kind == STACKS:
+        config = read_json(os.path.join(root, CONFIG_FILE)) or {}
+        found = list(config.get("templates", {})) + found
+    seen = set()
+    return [c for c in found if c.startswith(prefix) and not (c in seen or seen.add(c))]
+
+
+def refresh():
+    """fetch live names to the cache, run in the workspace root"""
+    from cfut import cache, commands
+
+    def fetch(args: List[str]) -> List[str]:
+        try:
+            err, out = commands.run_cli_parsed_output(args)
+        except OSError:
+            return []
+        return sorted(out) if not err and out else []
+
+    try:
+        commands.set_profile(commands.get_config().profile)
+        stacks, repos, families = commands.run_concurrently(
+            fetch,
+            [
+                ["cloudformation", "describe-stacks", "--query", "Stacks[].StackName"],
+                ["ecr", "describe-repositories", "--query", "repositories[].repositoryName"],
+                ["ecs", "list-task-definition-families", "--status", "ACTIVE"]
+                + ["--query", "families"],
+            ],
+        )
+        cache.save_json(
+            os.path.basename(CACHE_FILE), {STACKS: stacks, REPOS: repos, FAMILIES: families}
+        )
+    finally:
+        try:
+            os.remove(REFRESH_MARKER)
+        except FileNotFoundError:
+            pass
+
+
+def entry():
+    """console script entry point"""
+    if sys.argv[1:2] == [COMPLETE_COMMAND]:
+        line = sys.argv[2] if len(sys.argv) > 2 else ""
+        print("\n".join(candidates(split_line(line), find_root())))
+        return
+    if sys.argv[1:2] == ["completion"]:
+        # usually run from a shell rc file, outside of any workspace
+        shell = sys.argv[2] if len(sys.argv) == 3 else None
+        if shell not in SCRIPTS:
+            sys.exit(f"usage: cfut completion {{{','.join(sorted(SCRIPTS))}}}")
+        print(SCRIPTS[shell])
+        return
+    from cfut.cli import main
+
+    main()
@@ -20,7 +20,11 @@ Usage: have a model class:
 
 import argparse
 import dataclasses
+import json
 import operator
+import types
+import typing
+from enum import Enum
 from typing import Any, List
 
 
@@ -55,11 +59,63 @@ def apply_config_overrides(config_obj: Any, overrides: List[str]) -> None:
         assign_by_path(config_obj, name, value)
 
 
+TRUE_WORDS = ("1", "true", "yes", "on")
+FALSE_WORDS = ("0", "false", "no", "off")
+
+
+def coerce_value(tp: Any, value: str) -> Any:
+    """convert string from command line to type tp, ValueError if not possible
+
+    Optional fields take 'null' as None, lists take comma separated values,
+    dicts (and anything else) take json.
+    """
+    origin = typing.get_origin(tp)
+    if origin in (typing.Union, types.UnionType):
+        args = typing.get_args(tp)
+        if type(None) in args and value == "null":
+            return None
+        [tp] = [a for a in args if a is not type(None)]
+        return coerce_value(tp, value)
+    if origin is list:
+        [item_type] = typing.get_args(tp) or [str]
+        return [coerce_value(item_type, v) for v in value.split(",")] if value else []
+    if tp is str or tp is Any:
+        return value
+    if tp is bool:
+        if value.lower() in TRUE_WORDS:
+            return True
+        if value.lower() in FALSE_WORDS:
+            return False
+        raise ValueError(f"expected one of {TRUE_WORDS + FALSE_WORDS}, got '{value}'")
+    if isinstance(tp, type) and issubclass(tp, Enum):
+        return tp(value)
+    if tp in (int, float):
+        return tp(value)
+    return json.loads(value)
+
+
 def assign_by_path(target_obj, path: str, value: Any) -> None:
-    """assign 'deep' attribute within config model by path foo.bar.name"""
+    """assign 'deep' attribute within config model by path foo.bar.name
+
+    String values are converted to the type of the dataclass field.
+    Raises ValueError for unknown fields and values of wrong type.
+    """
     parts = path.rsplit(".", 1)
     if len(parts) == 1:
         assign_to, name = target_obj, parts[0]
     else:
-        assign_to, name = operator.attrgetter(parts[0])(target_obj), parts[1]
+        try:
+            assign_to, name = operator.attrgetter(parts[0])(target_obj), parts[1]
+        except AttributeError:
+            raise ValueError(f"Can't set {path}: no such field '{parts[0]}'") from None
+    if not dataclasses.is_dataclass(assign_to):
+        raise ValueError(f"Can't set {path}: '{parts[0]}' is not configured")
+    hints = typing.get_type_hints(type(assign_to))
+    if name not in hints:
+        raise ValueError(f"Can't set {path}: no such field '{name}'")
+    if isinstance(value, str):
+        try:
+            value = coerce_value(hints[name], value)
+        except ValueError as e:
+            raise ValueError(f"Bad value for {path}: {e}") from None
     setattr(assign_to, name, value)
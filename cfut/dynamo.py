@@ -0,0 +1,256 @@
+"""Bulk loading of DynamoDB tables
+
+Items are read lazily from YAML, JSON or JSONL files, serialized to DynamoDB
+attribute values and written with batch-write-item by a pool of workers.
+"""
+
+import base64
+import json
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+import yaml
+
+from cfut.commands import CfutError, run_cli_parsed_output
+
+# batch-write-item limit
+BATCH_SIZE = 25
+
+MAX_ATTEMPTS = 8
+BACKOFF_BASE = 0.05
+BACKOFF_MAX = 5.0
+
+
+def to_attribute(value: Any) -> Dict[str, Any]:
+    """plain python value => DynamoDB attribute value"""
+    if value is None:
+        return {"NULL": True}
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, (int, float, Decimal)):
+        return {"N": str(value)}
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, bytes):
+        return {"B": base64.b64encode(value).decode()}
+    if isinstance(value, (set, frozenset)):
+        if not value:
+            raise ValueError("Can't store an empty set in DynamoDB")
+        if all(isinstance(v, str) for v in value):
+            return {"SS": sorted(value)}
+        if all(isinstance(v, bytes) for v in value):
+            return {"BS": sorted(base64.b64encode(v).decode() for v in value)}
+        if all(isinstance(v, (int, float, Decimal)) and not isinstance(v, bool) for v in value):
+            return {"NS": sorted(str(v) for v in value)}
+        raise ValueError(f"Set must be all strings, all numbers or all bytes: {value!r}")
+    if isinstance(value, (list, tuple)):
+        return {"L": [to_attribute(v) for v in value]}
+    if isinstance(value, dict):
+        return {"M": to_item(value)}
+    raise ValueError(f"Can't store {type(value).__name__} in DynamoDB: {value!r}")
+
+
+def to_item(obj: Dict[str, Any]) -> Dict[str, Any]:
+    return {str(k): to_attribute(v) for k, v in obj.items()}
+
+
+def from_attribute(attr: Dict[str, Any]) -> Any:
+    """DynamoDB attribute value => plain python value, reverse of to_attribute"""
+    [(kind, value)] = attr.items()
+    if kind == "NULL":
+        return None
+    if kind in ("S", "BOOL"):
+        return value
+    if kind == "N":
+        return to_number(value)
+    if kind == "B":
+        return base64.b64decode(value)
+    if kind == "SS":
+        return set(value)
+    if kind == "NS":
+        return {to_number(v) for v in value}
+    if kind == "BS":
+        return {base64.b64decode(v) for v in value}
+    if kind == "L":
+        return [from_attribute(v) for v in value]
+    if kind == "M":
+        return from_item(value)
+    raise ValueError(f"Unknown DynamoDB attribute type {kind}")
+
+
+def from_item(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: from_attribute(v) for k, v in item.items()}
+
+
+def to_number(value: str):
+    """'3' => 3, '1.5' => Decimal('1.5'). N has up to 38 digits, more than float"""
+    try:
+        return int(value)
+    except ValueError:
+        return Decimal(value)
+
+
+class _ItemDumper(yaml.SafeDumper):
+    pass
+
+
+def _represent_decimal(dumper: yaml.SafeDumper, value: Decimal):
+    text = str(value)
+    if "." not in text and "E" in text:
+        # yaml floats need a dot to be read back as floats
+        text = text.replace("E", ".0E", 1)
+    return dumper.represent_scalar("tag:yaml.org,2002:float", text.lower())
+
+
+_ItemDumper.add_representer(Decimal, _represent_decimal)
+
+
+class _ItemLoader(yaml.SafeLoader):
+    pass
+
+
+def _construct_decimal(loader: yaml.SafeLoader, node: yaml.Node):
+    text = loader.construct_scalar(node).replace("_", "")
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        # .inf, .nan, sexagesimal
+        return loader.construct_yaml_float(node)
+
+
+# yaml floats are read as Decimal, so values are stored exactly as written
+_ItemLoader.add_constructor("tag:yaml.org,2002:float", _construct_decimal)
+
+
+def dump_items(items: List[Dict[str, Any]]) -> str:
+    """items as yaml that read_items loads back unchanged"""
+    return yaml.dump(items, Dumper=_ItemDumper)
+
+
+def read_items(path: str) -> Iterator[Dict[str, Any]]:
+    """plain dicts from .yml/.yaml, .json or .jsonl file
+
+    JSONL is streamed line by line. YAML is streamed by document, each
+    document being a single item or a list of them (like 'ddump' output).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path) as f:
+        if ext == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line, parse_float=Decimal)
+        elif ext == ".json":
+            data = json.load(f, parse_float=Decimal)
+            yield from data if isinstance(data, list) else [data]
+        elif ext in (".yml", ".yaml"):
+            for doc in yaml.load_all(f, Loader=_ItemLoader):
+                if isinstance(doc, list):
+                    yield from doc
+                elif doc is not None:
+                    yield doc
+        else:
+            raise CfutError(f"Unknown file type '{ext}', expected .yml, .yaml, .json or .jsonl")
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for it in items:
+        batch.append(it)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def batch_write(request_items: Dict[str, List]) -> Dict[str, List]:
+    """one batch-write-item call, returns UnprocessedItems"""
+    fd, fname = tempfile.mkstemp(suffix=".json")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(request_items, f)
+        # via file, a single argument can't be over 128k on linux
+        err, out = run_cli_parsed_output(
+            ["dynamodb", "batch-write-item", "--request-items", "file://" + fname]
+        )
+    finally:
+        os.remove(fname)
+    if err:
+        raise CfutError(f"batch-write-item failed: {err}")
+    return out.get("UnprocessedItems") or {}
+
+
+def write_with_retry(
+    table: str,
+    items: List[Dict[str, Any]],
+    write: Callable[[Dict[str, List]], Dict[str, List]] = batch_write,
+):
+    pending = {table: [{"PutRequest": {"Item": item}} for item in items]}
+    for attempt in range(MAX_ATTEMPTS):
+        pending = write(pending)
+        if not pending:
+            return
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt)
+        time.sleep(delay * random.uniform(0.5, 1.0))
+    left = len(pending.get(table, []))
+    raise CfutError(f"{left} items still unprocessed after {MAX_ATTEMPTS} attempts")
+
+
+def load_table(
+    table: str,
+    items: Iterable[Dict[str, Any]],
+    workers: int = 4,
+    write: Callable[[Dict[str, List]], Dict[str, List]] = batch_write,
+    report: Optional[Callable[[int, float], None]] = None,
+) -> int:
+    """write items to table, returns number of items written
+
+    At most 2 * workers batches are read ahead of the writers, so memory use
+    does not depend on the size of the input.
+    """
+    batches: queue.Queue[Optional[List]] = queue.Queue(maxsize=2 * workers)
+    lock = threading.Lock()
+    errors: List[Exception] = []
+    written = 0
+    started = time.monotonic()
+
+    def worker():
+        nonlocal written
+        while 1:
+            batch = batches.get()
+            if batch is None:
+                return
+            if errors:
+                continue
+            try:
+                write_with_retry(table, batch, write)
+            except Exception as e:
+                errors.append(e)
+                continue
+            with lock:
+                written += len(batch)
+                if report:
+                    report(written, time.monotonic() - started)
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    try:
+        for batch in chunked((to_item(it) for it in items), BATCH_SIZE):
+            if errors:
+                break
+            batches.put(batch)
+    finally:
+        for _ in threads:
+            batches.put(None)
+        for t in threads:
+            t.join()
+    if errors:
+        raise errors[0]
+    return written
@@ -0,0 +1,146 @@
+"""Deploy history in a local SQLite database
+
+Every create/update/delete that cfut waits for is recorded with its duration
+and the durations of the individual resources, taken from stack events. The
+history gives ETAs for later deploys, and p50/p95 times for 'cfut history'.
+"""
+
+import math
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from cfut.cache import cache_path
+
+DB_FILE = "history.db"
+
+SCHEMA = """
+create table if not exists deploys (
+    id integer primary key,
+    stack text not null,
+    operation text not null,
+    started real not null,
+    ended real not null,
+    status text not null,
+    ok integer not null
+);
+create index if not exists deploys_stack on deploys (stack, operation);
+create table if not exists resources (
+    deploy_id integer not null references deploys (id),
+    logical_id text not null,
+    type text not null,
+    started real not null,
+    ended real not null
+);
+create index if not exists resources_deploy on resources (deploy_id);
+"""
+
+# deploys older than this many successful ones are not used for estimates
+ESTIMATE_WINDOW = 20
+
+
+def connect(path: Optional[str] = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(path or cache_path(DB_FILE))
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def parse_timestamp(ts: str) -> float:
+    return datetime.fromisoformat(ts).timestamp()
+
+
+def resource_timings(
+    events: List[Dict], stack_name: str, since: float
+) -> List[Tuple[str, str, float, Optional[float]]]:
+    """(logical id, type, started, ended or None) from stack events newer than since
+
+    Events are in describe-stack-events order, newest first.
+    """
+    timings: Dict[str, List] = {}
+    for e in reversed(events):
+        ts = parse_timestamp(e["Timestamp"])
+        logical = e["LogicalResourceId"]
+        if ts < since or logical == stack_name:
+            continue
+        status = e["ResourceStatus"]
+        if status.endswith("_IN_PROGRESS"):
+            timings.setdefault(logical, [logical, e["ResourceType"], ts, None])
+        elif logical in timings and timings[logical][3] is None:
+            timings[logical][3] = ts
+    return [tuple(t) for t in timings.values()]  # type: ignore
+
+
+def percentile(values: List[float], p: float) -> float:
+    """nearest-rank percentile, p in 0..100"""
+    ordered = sorted(values)
+    rank = max(0, math.ceil(p / 100 * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def record_deploy(
+    conn: sqlite3.Connection,
+    stack: str,
+    operation: str,
+    started: float,
+    ended: float,
+    status: str,
+    ok: bool,
+    resources: List[Tuple[str, str, float, Optional[float]]],
+):
+    with conn:
+        cur = conn.execute(
+            "insert into deploys (stack, operation, started, ended, status, ok)"
+            " values (?, ?, ?, ?, ?, ?)",
+            (stack, operation, started, ended, status, ok),
+        )
+        conn.executemany(
+            "insert into resources values (?, ?, ?, ?, ?)",
+            [(cur.lastrowid, lid, typ, s, e) for lid, typ, s, e in resources if e is not None],
+        )
+
+
+def _recent_ok_deploys(conn: sqlite3.Connection, stack: str, operation: str) -> List[Tuple]:
+    return conn.execute(
+        "select id, ended - started from deploys where stack = ? and operation = ? and ok"
+        " order by started desc limit ?",
+        (stack, operation, ESTIMATE_WINDOW),
+    ).fetchall()
+
+
+def expected_duration(conn: sqlite3.Connection, stack: str, operation: str) -> Optional[float]:
+    """median duration of recent successful deploys"""
+    rows = _recent_ok_deploys(conn, stack, operation)
+    return percentile([d for _, d in rows], 50) if rows else None
+
+
+def resource_baselines(conn: sqlite3.Connection, stack: str, operation: str) -> Dict[str, float]:
+    """logical id => median duration in recent successful deploys"""
+    ids = [i for i, _ in _recent_ok_deploys(conn, stack, operation)]
+    if not ids:
+        return {}
+    durations: Dict[str, List[float]] = {}
+    marks = ",".join("?" * len(ids))
+    for logical, d in conn.execute(
+        f"select logical_id, ended - started from resources where deploy_id in ({marks})", ids
+    ):
+        durations.setdefault(logical, []).append(d)
+    return {k: percentile(v, 50) for k, v in durations.items()}
+
+
+def deploy_stats(conn: sqlite3.Connection, stacks: Optional[List[str]] = None) -> List[Tuple]:
+    """(stack, operation, count, p50, p95) of successful deploys"""
+    grouped: Dict[Tuple[str, str], List[float]] = {}
+    for stack, op, d in conn.execute(
+        "select stack, operation, ended - started from deploys where ok order by stack, operation"
+    ):
+        if stacks is None or stack in stacks:
+            grouped.setdefault((stack, op), []).append(d)
+    return [
+        (stack, op, len(ds), percentile(ds, 50), percentile(ds, 95))
+        for (stack, op), ds in grouped.items()
+    ]
+
+
+def format_duration(seconds: float) -> str:
+    m, s = divmod(int(seconds), 60)
+    return f"{m}:{s:02d}"
@@ -0,0 +1,217 @@
+"""Local mirror of a CloudWatch log group
+
+'sync' fetches only new events, resuming every stream from the token saved
+by the previous sync. Events are stored in gzipped JSONL segments, one per
+sync, and index.json keeps the time range of every segment so that 'grep'
+only opens segments that can contain matches. When the archive grows over
+its size limit, the oldest segments are evicted.
+"""
+
+import gzip
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from cfut.cache import cache_path
+from cfut.commands import CfutError, run_cli_parsed_output, run_concurrently
+
+MAX_ARCHIVE_BYTES = 200 * 1024 * 1024
+# streams with no events in this time are not synced on first run
+DEFAULT_SYNC_DAYS = 7
+
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+# characters that json.dumps writes unchanged and that are not regex syntax
+LITERAL_CHARS = frozenset(c for c in map(chr, range(32, 127)) if c not in '"\\.^$*+?{}[]|()')
+
+
+def literal_hint(pattern: str) -> str:
+    """longest plain substring every match of pattern must contain, or ''
+
+    Events are stored as json lines, so this can be searched in the raw line
+    before decoding it. Json escaping changes only quotes, backslashes and
+    control characters, which never end up in the hint.
+    """
+    # groups can be optional or repeated, and escapes like \x41 or \d are not
+    # the text they are written as. Only flat patterns get a hint.
+    if re.search(r"[|()]|\\[0-9A-Za-z]", pattern):
+        return ""
+    runs = [""]
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            nxt = pattern[i + 1 : i + 2]
+            # escaped punctuation is literal
+            if nxt and " " <= nxt <= "~" and nxt not in '"\\':
+                runs[-1] += nxt
+            else:
+                runs.append("")
+            i += 2
+            continue
+        if ch == "[":
+            # skip character class
+            i += 1
+            if pattern[i : i + 1] == "^":
+                i += 1
+            if pattern[i : i + 1] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            runs.append("")
+        elif ch in "?*{":
+            # previous character may be missing or repeated
+            runs[-1] = runs[-1][:-1]
+            runs.append("")
+            if ch == "{":
+                i = pattern.find("}", i)
+                if i == -1:
+                    break
+        elif ch in LITERAL_CHARS:
+            runs[-1] += ch
+        else:
+            runs.append("")
+        i += 1
+    return max(runs, key=len)
+
+
+def parse_since(since: str) -> int:
+    """'30m', '12h', '2d' => epoch milliseconds"""
+    m = re.fullmatch(r"(\d+)([smhdw])", since)
+    if not m:
+        raise CfutError(f"Bad time '{since}', expected e.g. 30m, 12h or 2d")
+    seconds = int(m.group(1)) * UNITS[m.group(2)]
+    return int((time.time() - seconds) * 1000)
+
+
+class LogArchive:
+    def __init__(self, group: str, max_bytes: int = MAX_ARCHIVE_BYTES):
+        self.group = group
+        self.max_bytes = max_bytes
+        self.dir = cache_path(os.path.join("logs", re.sub(r"[^\w.-]", "_", group)))
+        os.makedirs(self.dir, exist_ok=True)
+        self.index_file = os.path.join(self.dir, "index.json")
+        try:
+            with open(self.index_file) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {"streams": {}, "segments": [], "next_segment": 0}
+
+    def save_index(self):
+        tmp = self.index_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp, self.index_file)
+
+    def list_streams(self, since_ms: int) -> List[Dict]:
+        """streams with events after since_ms, newest first"""
+        err, out = run_cli_parsed_output(
+            [
+                "logs",
+                "describe-log-streams",
+                "--order-by",
+                "LastEventTime",
+                "--descending",
+                "--log-group-name",
+                self.group,
+            ]
+        )
+        if err:
+            raise CfutError(f"Could not list log streams: {err}")
+        return [s for s in out["logStreams"] if s.get("lastEventTimestamp", 0) >= since_ms]
+
+    def fetch_stream(self, stream: str, since_ms: int) -> Tuple[List, Optional[str]]:
+        """new events of stream and the token to resume from next time"""
+        token = self.index["streams"].get(stream, {}).get("token")
+        base = ["logs", "get-log-events", "--start-from-head", "--log-group-name", self.group]
+        base += ["--log-stream-name", stream]
+        events = []
+        while 1:
+            if token:
+                position = ["--next-token", token]
+            else:
+                position = ["--start-time", str(since_ms)]
+            err, out = run_cli_parsed_output(base + position)
+            if err:
+                raise CfutError(f"Could not read log stream {stream}: {err}")
+            events.extend([e["timestamp"], stream, e["message"]] for e in out["events"])
+            # the forward token stays the same when the end of stream is reached
+            if out["nextForwardToken"] == token or not out["events"]:
+                return events, out["nextForwardToken"]
+            token = out["nextForwardToken"]
+
+    def sync(self, since_ms: Optional[int] = None) -> int:
+        """returns number of new events"""
+        if since_ms is None:
+            since_ms = int((time.time() - DEFAULT_SYNC_DAYS * 86400) * 1000)
+        known = self.index["streams"]
+        ingested = {
+            s["logStreamName"]: s.get("lastIngestionTime") for s in self.list_streams(since_ms)
+        }
+        changed = [
+            stream
+            for stream, last in ingested.items()
+            if last != known.get(stream, {}).get("ingested")
+        ]
+        results = run_concurrently(lambda s: self.fetch_stream(s, since_ms), changed)
+        new_events = []
+        for stream, (events, token) in zip(changed, results):
+            new_events.extend(events)
+            known[stream] = {"token": token, "ingested": ingested.get(stream)}
+        if new_events:
+            self.write_segment(new_events)
+        self.evict()
+        self.save_index()
+        return len(new_events)
+
+    def write_segment(self, events: List):
+        events.sort(key=lambda e: e[0])
+        name = f"seg-{self.index['next_segment']:06d}.jsonl.gz"
+        self.index["next_segment"] += 1
+        path = os.path.join(self.dir, name)
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for e in events:
+                f.write(json.dumps(e, ensure_ascii=False) + "\n")
+        self.index["segments"].append(
+            {
+                "file": name,
+                "min_ts": events[0][0],
+                "max_ts": events[-1][0],
+                "count": len(events),
+                "size": os.path.getsize(path),
+            }
+        )
+
+    def evict(self):
+        segments = sorted(self.index["segments"], key=lambda s: s["max_ts"])
+        total = sum(s["size"] for s in segments)
+        while segments and total > self.max_bytes:
+            oldest = segments.pop(0)
+            total -= oldest["size"]
+            try:
+                os.remove(os.path.join(self.dir, oldest["file"]))
+            except FileNotFoundError:
+                pass
+        self.index["segments"] = segments
+
+    def grep(self, pattern: str, since_ms: int = 0) -> List[List]:
+        """[timestamp, stream, message] of matching events, oldest first"""
+        regex = re.compile(pattern)
+        # cheap prefilter on the raw json line
+        hint = literal_hint(pattern)
+        matches = []
+        for seg in self.index["segments"]:
+            if seg["max_ts"] < since_ms:
+                continue
+            with gzip.open(os.path.join(self.dir, seg["file"]), "rt", encoding="utf-8") as f:
+                for line in f:
+                    if hint not in line:
+                        continue
+                    e = json.loads(line)
+                    if e[0] >= since_ms and regex.search(e[2]):
+                        matches.append(e)
+        matches.sort(key=lambda e: e[0])
+        return matches
@@ -1,5 +1,6 @@
 import json
 import os
+from collections.abc import Iterator, Mapping
 from dataclasses import asdict, dataclass, field, fields
 from enum import Enum
 from functools import lru_cache
@@ -12,7 +13,7 @@ class Capability(str, Enum):
     CAPABILITY_AUTO_EXPAND = "CAPABILITY_AUTO_EXPAND"
 
 
-@dataclass
+@dataclass(slots=True)
 class CfnTemplate:
     name: str
     path: str
@@ -20,7 +21,7 @@ class CfnTemplate:
     parameters: Optional[Dict[str, Any]] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class EcrConfig:
     repo: str = field(
         metadata={"description": "ECR repository name, e.g. my-repo. Not the full URL!"}
@@ -41,17 +42,21 @@ class EcrConfig:
     src: str = field(
         default=".", metadata={"description": "Directory where Dockerfile is"}
     )
+    cache_from: Optional[str] = field(
+        default=None,
+        metadata={"description": "Tag in the repo to use as build cache, e.g. 'latest'"},
+    )
 
 
-@dataclass
+@dataclass(slots=True)
 class EcsConfig:
     run_args: List[str] = field(default_factory=list)
     cluster: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class IniFile:
-    templates: Dict[str, CfnTemplate]
+    templates: Mapping[str, CfnTemplate]
     ecs: Optional[EcsConfig] = None
     ecr: Optional[EcrConfig] = None
     profile: Optional[str] = None
@@ -80,10 +85,9 @@ def _filter_kwargs(cls, data: Dict[str, Any]) -> Dict[str, Any]:
     return {k: v for k, v in data.items() if k in names}
 
 
-def load_inifile(raw: str) -> IniFile:
-    data = json.loads(raw)
-    templates = {
-        k: CfnTemplate(
+def template_from_dict(alias: str, v: Dict[str, Any]) -> CfnTemplate:
+    try:
+        return CfnTemplate(
             name=v["name"],
             path=v["path"],
             capabilities=[Capability(c) for c in v["capabilities"]]
@@ -91,12 +95,41 @@ def load_inifile(raw: str) -> IniFile:
             else None,
             parameters=v.get("parameters"),
         )
-        for k, v in data.get("templates", {}).items()
-    }
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Bad template '{alias}' in config: {e!r}") from e
+
+
+class LazyTemplates(Mapping):
+    """alias => CfnTemplate, built from the raw config on first access
+
+    Huge configs are cheap to load when a command only needs a few stacks.
+    """
+
+    def __init__(self, raw: Dict[str, Dict[str, Any]]):
+        self._raw = raw
+        self._built: Dict[str, CfnTemplate] = {}
+
+    def __getitem__(self, alias: str) -> CfnTemplate:
+        found = self._built.get(alias)
+        if found is None:
+            found = self._built[alias] = template_from_dict(alias, self._raw[alias])
+        return found
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._raw)
+
+    def __len__(self) -> int:
+        return len(self._raw)
+
+    def __contains__(self, alias: object) -> bool:
+        return alias in self._raw
+
+
+def inifile_from_data(data: Dict[str, Any]) -> IniFile:
     ecr = EcrConfig(**_filter_kwargs(EcrConfig, data["ecr"])) if data.get("ecr") else None
     ecs = EcsConfig(**_filter_kwargs(EcsConfig, data["ecs"])) if data.get("ecs") else None
     return IniFile(
-        templates=templates,
+        templates=LazyTemplates(data.get("templates") or {}),
         ecr=ecr,
         ecs=ecs,
         profile=data.get("profile"),
@@ -104,5 +137,28 @@ def load_inifile(raw: str) -> IniFile:
     )
 
 
+def load_inifile(raw: str) -> IniFile:
+    return inifile_from_data(json.loads(raw))
+
+
+def read_inifile(path: str) -> IniFile:
+    """load config file, paths in it are made relative to its directory"""
+    with open(path) as f:
+        data = json.load(f)
+    root = os.path.dirname(path)
+    if root:
+        for t in (data.get("templates") or {}).values():
+            if isinstance(t, dict) and "path" in t:
+                t["path"] = os.path.join(root, t["path"])
+        if data.get("ecr") and "src" in data["ecr"]:
+            data["ecr"]["src"] = os.path.join(root, data["ecr"]["src"])
+    return inifile_from_data(data)
+
+
 def dump_inifile(ini: IniFile, indent: int = 2) -> str:
-    return json.dumps(asdict(ini), indent=indent)
+    data = {f.name: getattr(ini, f.name) for f in fields(ini)}
+    data["templates"] = {k: asdict(v) for k, v in ini.templates.items()}
+    for name in ("ecs", "ecr"):
+        if data[name] is not None:
+            data[name] = asdict(data[name])
+    return json.dumps(data, indent=indent)
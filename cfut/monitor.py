@@ -0,0 +1,131 @@
+"""Live view of many stacks from one shared poller
+
+Each tick makes one describe-stacks call for all stacks, and reads the
+latest event only of stacks with an operation in progress, at most
+MAX_EVENT_TAILS of them per tick in rotation. The number of calls stays the
+same however many stacks are in flight.
+"""
+
+import shutil
+import sys
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+from cfut.commands import CfutError, run_cli_parsed_output, run_concurrently
+from cfut.history import format_duration, parse_timestamp
+
+POLL_INTERVAL = 3
+MAX_EVENT_TAILS = 4
+
+# cursor up to first line of previous table, clear to end of screen
+REDRAW = "\x1b[{}F\x1b[J"
+
+
+@dataclass
+class StackRow:
+    name: str
+    status: str = "NOT_EXIST"
+    # start of the latest operation, epoch seconds
+    started: Optional[float] = None
+    event: str = ""
+
+
+def is_active(status: str) -> bool:
+    return status.endswith("_IN_PROGRESS")
+
+
+def describe_all_stacks() -> Dict[str, Dict]:
+    """stack name => describe-stacks entry, for all stacks"""
+    err, out = run_cli_parsed_output(["cloudformation", "describe-stacks"])
+    if err:
+        raise CfutError(f"Could not list stacks: {err}")
+    return {s["StackName"]: s for s in out["Stacks"]}
+
+
+def latest_event(stack_name: str) -> str:
+    err, out = run_cli_parsed_output(
+        ["cloudformation", "describe-stack-events", "--stack-name", stack_name]
+        + ["--max-items", "1"]
+    )
+    if err or not out["StackEvents"]:
+        return ""
+    e = out["StackEvents"][0]
+    reason = e.get("ResourceStatusReason")
+    return f"{e['LogicalResourceId']} {e['ResourceStatus']}" + (f": {reason}" if reason else "")
+
+
+class Monitor:
+    """stack_names None tracks every stack in the account"""
+
+    def __init__(self, stack_names: Optional[List[str]] = None):
+        self.stack_names = stack_names
+        self.rows: Dict[str, StackRow] = {n: StackRow(n) for n in stack_names or []}
+        self.tail_queue: Deque[str] = deque()
+
+    def update(self, stacks: Dict[str, Dict]) -> List[str]:
+        """update rows from describe_all_stacks, returns stacks whose events to read"""
+        names = self.stack_names if self.stack_names is not None else sorted(stacks)
+        for name in names:
+            row = self.rows.setdefault(name, StackRow(name))
+            s = stacks.get(name)
+            if s is None:
+                # deleted stacks drop out of describe-stacks
+                row.status = "DELETE_COMPLETE" if row.status != "NOT_EXIST" else row.status
+                continue
+            if s["StackStatus"] != row.status:
+                row.event = ""
+            row.status = s["StackStatus"]
+            ts = s.get("DeletionTime") or s.get("LastUpdatedTime") or s["CreationTime"]
+            row.started = parse_timestamp(ts)
+
+        active = [n for n in names if is_active(self.rows[n].status)]
+        self.tail_queue = deque(
+            [n for n in self.tail_queue if n in active]
+            + [n for n in active if n not in self.tail_queue]
+        )
+        tails = list(self.tail_queue)[:MAX_EVENT_TAILS]
+        self.tail_queue.rotate(-len(tails))
+        return tails
+
+    def format_rows(self, now: float) -> List[str]:
+        rows = list(self.rows.values())
+        width = max([len(r.name) for r in rows] + [5])
+        lines = [f"{'stack':<{width}}  {'status':<36} {'elapsed':>7}  latest event"]
+        for r in rows:
+            elapsed = format_duration(now - r.started) if r.started and is_active(r.status) else ""
+            lines.append(f"{r.name:<{width}}  {r.status:<36} {elapsed:>7}  {r.event}")
+        return lines
+
+    def tick(self):
+        tails = self.update(describe_all_stacks())
+        for name, event in zip(tails, run_concurrently(latest_event, tails)):
+            if event:
+                self.rows[name].event = event
+
+    def run(self, until_idle: bool = False):
+        tty = sys.stdout.isatty()
+        drawn = 0
+        printed: Dict[str, tuple] = {}
+        while 1:
+            self.tick()
+            now = time.time()
+            lines = self.format_rows(now)
+            if tty:
+                cols = shutil.get_terminal_size().columns
+                # lines must not wrap, or redraw would move up too few lines
+                out = [line[: cols - 1] for line in lines]
+                prefix = REDRAW.format(drawn) if drawn else ""
+                sys.stdout.write(prefix + "\n".join(out) + "\n")
+                sys.stdout.flush()
+                drawn = len(out)
+            else:
+                # not a terminal: print rows as they change
+                for r, line in zip(self.rows.values(), lines[1:]):
+                    if printed.get(r.name) != (r.status, r.event):
+                        printed[r.name] = (r.status, r.event)
+                        print(line.strip())
+            if until_idle and not any(is_active(r.status) for r in self.rows.values()):
+                return
+            time.sleep(POLL_INTERVAL)
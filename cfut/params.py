@@ -0,0 +1,115 @@
+"""Dynamic parameter values for templates in cfut.json
+
+A parameter value is either a literal, or a single-key dict naming where the
+value comes from:
+
+    "parameters": {
+        "Env": "dev",
+        "VpcId": {"ref": "network.VpcId"}
+    }
+
+"ref" reads an output of another stack. The part before the dot is a cfut
+alias (or a plain stack name if no such alias exists), the rest is the
+output key.
+
+"ssm" reads an SSM parameter by path, e.g. {"ssm": "/app/dev/db-host"}, and
+"secret" reads a Secrets Manager secret by name or ARN, e.g.
+{"secret": "app/dev/db-password"}.
+
+This module only parses and substitutes values. Fetching is done in
+commands.py, so that everything here can be tested without AWS.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set, Tuple, Union
+
+from cfut.models import CfnTemplate
+
+SOURCE_STACK_OUTPUT = "ref"
+SOURCE_SSM = "ssm"
+SOURCE_SECRET = "secret"
+
+SOURCES = (SOURCE_STACK_OUTPUT, SOURCE_SSM, SOURCE_SECRET)
+
+
+@dataclass(frozen=True)
+class ParamRef:
+    source: str
+    key: str
+
+
+def parse_param_value(value: Any) -> Union[str, ParamRef]:
+    if not isinstance(value, dict):
+        return str(value)
+    if len(value) != 1:
+        raise ValueError(f"Parameter source must have exactly one key, got {value}")
+    [(source, key)] = value.items()
+    if source not in SOURCES:
+        raise ValueError(f"Unknown parameter source '{source}', expected one of {SOURCES}")
+    return ParamRef(source, str(key))
+
+
+def collect_refs(stacks: Iterable[CfnTemplate]) -> Set[ParamRef]:
+    """all dynamic references in parameters of given stacks"""
+    refs = set()
+    for stack in stacks:
+        for value in (stack.parameters or {}).values():
+            parsed = parse_param_value(value)
+            if isinstance(parsed, ParamRef):
+                refs.add(parsed)
+    return refs
+
+
+def split_output_ref(
+    ref: ParamRef, templates: Optional[Mapping[str, CfnTemplate]] = None
+) -> Tuple[str, str]:
+    """'alias.OutputKey' => (stack name, output key)"""
+    if "." not in ref.key:
+        raise ValueError(f"Stack output reference must be 'alias.OutputKey', got '{ref.key}'")
+    alias, output = ref.key.split(".", 1)
+    stack = (templates or {}).get(alias)
+    return (stack.name if stack else alias), output
+
+
+def resolve_parameters(
+    parameters: Optional[Dict[str, Any]], values: Mapping[ParamRef, str]
+) -> Dict[str, str]:
+    """substitute fetched values for references, stringify literals"""
+    resolved = {}
+    for name, value in (parameters or {}).items():
+        parsed = parse_param_value(value)
+        if isinstance(parsed, ParamRef):
+            if parsed not in values:
+                raise ValueError(f"Parameter {name}: no value for {parsed.source} '{parsed.key}'")
+            resolved[name] = values[parsed]
+        else:
+            resolved[name] = parsed
+    return resolved
+
+
+class LocalParameterStore:
+    """Stand-in for SSM and Secrets Manager, e.g. for tests
+
+    Use with commands.set_parameter_store(). Same interface as
+    commands.AwsParameterStore.
+    """
+
+    def __init__(
+        self,
+        ssm: Optional[Dict[str, str]] = None,
+        secrets: Optional[Dict[str, str]] = None,
+        secure_ssm: Iterable[str] = (),
+    ):
+        self.ssm = ssm or {}
+        self.secrets = secrets or {}
+        self.secure_ssm = set(secure_ssm)
+        self.calls: List[Tuple[str, List[str]]] = []
+
+    def get_ssm_parameters(self, names: List[str]) -> Dict[str, Tuple[str, bool]]:
+        """name => (value, is SecureString)"""
+        self.calls.append((SOURCE_SSM, names))
+        return {n: (self.ssm[n], n in self.secure_ssm) for n in names if n in self.ssm}
+
+    def get_secrets(self, secret_ids: List[str]) -> Dict[str, str]:
+        self.calls.append((SOURCE_SECRET, secret_ids))
+        return {i: self.secrets[i] for i in secret_ids if i in self.secrets}
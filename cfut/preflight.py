@@ -0,0 +1,79 @@
+"""Validating templates of a rollout before any stack is touched
+
+validate-template runs concurrently for every distinct template, and the
+parameters configured in cfut.json are checked against the ones the
+template declares. Successful results are cached by template content hash,
+so unchanged templates are not sent again.
+"""
+
+from typing import Dict, List
+
+from cfut.cache import file_digest, load_json, save_json
+from cfut.commands import CfutError, run_cli_parsed_output, run_concurrently
+from cfut.models import CfnTemplate
+
+VALIDATIONS_FILE = "validations.json"
+
+
+def validate_template(path: str) -> Dict:
+    """{"parameters": {name: has default}, "capabilities": [...]} of template"""
+    err, out = run_cli_parsed_output(
+        ["cloudformation", "validate-template", "--template-body", "file://" + path]
+    )
+    if err:
+        raise CfutError(f"{path}: {err.strip()}")
+    return {
+        "parameters": {p["ParameterKey"]: "DefaultValue" in p for p in out.get("Parameters", [])},
+        "capabilities": out.get("Capabilities", []),
+    }
+
+
+def check_stack(stack: CfnTemplate, summary: Dict) -> List[str]:
+    """problems with configuration of stack, given validate_template summary"""
+    declared: Dict[str, bool] = summary["parameters"]
+    configured = stack.parameters or {}
+    problems = []
+    unknown = sorted(set(configured) - set(declared))
+    if unknown:
+        problems.append(f"parameters not in template: {', '.join(unknown)}")
+    missing = sorted(
+        k for k, has_default in declared.items() if not has_default and k not in configured
+    )
+    if missing:
+        problems.append(f"parameters without value: {', '.join(missing)}")
+    given = {c.name for c in stack.capabilities or []}
+    needed = [c for c in summary["capabilities"] if c not in given]
+    # CAPABILITY_NAMED_IAM covers CAPABILITY_IAM
+    if "CAPABILITY_IAM" in needed and "CAPABILITY_NAMED_IAM" in given:
+        needed.remove("CAPABILITY_IAM")
+    if needed:
+        problems.append(f"capabilities needed: {', '.join(needed)}")
+    return [f"{stack.name} ({stack.path}): {p}" for p in problems]
+
+
+def validate_stacks(stacks: List[CfnTemplate]):
+    """raise CfutError listing every problem found in stacks"""
+    cached = load_json(VALIDATIONS_FILE, {})
+    digests = {s.path: file_digest(s.path) for s in stacks}
+    todo = sorted({path for path, digest in digests.items() if digest not in cached})
+    for path in todo:
+        print(f"Validating {path}")
+
+    def validate(path: str):
+        try:
+            return validate_template(path), None
+        except CfutError as e:
+            return None, str(e)
+
+    results = run_concurrently(validate, todo)
+    errors = [err for _, err in results if err]
+    fresh = {digests[path]: summary for path, (summary, _) in zip(todo, results) if summary}
+    if fresh:
+        cached.update(fresh)
+        save_json(VALIDATIONS_FILE, cached)
+    for stack in stacks:
+        summary = cached.get(digests[stack.path])
+        if summary:
+            errors.extend(check_stack(stack, summary))
+    if errors:
+        raise CfutError("Pre-flight validation failed:\n" + "\n".join(errors))
@@ -0,0 +1,85 @@
+"""Running external commands
+
+Commands are argv lists and are never passed through a shell, so arguments
+with spaces or quotes need no escaping. The number of processes running at
+the same time is capped, so callers can fan out from thread pools freely.
+"""
+
+import shlex
+import shutil
+import subprocess
+import sys
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional
+
+MAX_PROCESSES = 8
+# what a shell returns for a missing command
+NOT_FOUND = 127
+
+_process_slots = threading.BoundedSemaphore(MAX_PROCESSES)
+
+
+@dataclass
+class ProcResult:
+    returncode: int
+    stdout: bytes
+    stderr: str
+
+
+def format_argv(argv: List[str]) -> str:
+    """command line for display"""
+    return shlex.join(argv)
+
+
+@lru_cache()
+def _resolve(executable: str) -> str:
+    # finds e.g. aws.cmd on windows, which CreateProcess would not
+    return shutil.which(executable) or executable
+
+
+def not_found(executable: str, show: bool = True) -> str:
+    message = f"{executable}: command not found"
+    if show:
+        print(message, file=sys.stderr)
+    return message
+
+
+def run(argv: List[str], capture: bool = True, stdin: Optional[bytes] = None) -> ProcResult:
+    """run to completion. With capture=False, output goes to our stdout/stderr
+
+    A missing executable gives returncode 127, like in a shell.
+    """
+    executable = argv[0]
+    argv = [_resolve(executable)] + argv[1:]
+    try:
+        with _process_slots:
+            p = subprocess.run(argv, capture_output=capture, input=stdin)
+    except FileNotFoundError:
+        return ProcResult(NOT_FOUND, b"", not_found(executable, show=not capture))
+    stderr = p.stderr.decode(errors="replace") if capture else ""
+    return ProcResult(p.returncode, p.stdout if capture else b"", stderr)
+
+
+def run_pipe(producer: List[str], consumer: List[str]) -> int:
+    """producer | consumer, returns exit code of the first failing one"""
+    with _process_slots:
+        try:
+            first = subprocess.Popen([_resolve(producer[0])] + producer[1:], stdout=subprocess.PIPE)
+        except FileNotFoundError:
+            not_found(producer[0])
+            return NOT_FOUND
+        try:
+            second = subprocess.Popen([_resolve(consumer[0])] + consumer[1:], stdin=first.stdout)
+        except FileNotFoundError:
+            first.kill()
+            first.wait()
+            not_found(consumer[0])
+            return NOT_FOUND
+        # let producer get SIGPIPE if consumer exits early
+        assert first.stdout is not None
+        first.stdout.close()
+        second_ret = second.wait()
+        first_ret = first.wait()
+    return first_ret or second_ret
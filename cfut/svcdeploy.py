@@ -0,0 +1,140 @@
+"""Rolling ECS services to a new task definition revision
+
+All services are updated concurrently, then one loop tracks them with
+batched describe-services calls until every rollout has completed, failed,
+or stalled.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from cfut.commands import CfutError, batches, run_cli_parsed_output, run_concurrently
+
+# describe-services limit
+DESCRIBE_BATCH_SIZE = 10
+POLL_INTERVAL = 5
+# fail if a rollout shows no progress for this long
+DEFAULT_STALL_SECONDS = 600
+
+STATE_IN_PROGRESS = "IN_PROGRESS"
+STATE_COMPLETED = "COMPLETED"
+STATE_FAILED = "FAILED"
+
+
+@dataclass
+class ServiceRollout:
+    service: str
+    task_definition: str
+    state: str = STATE_IN_PROGRESS
+    detail: str = ""
+    progress: Tuple = ()
+    progressed_at: float = field(default_factory=time.monotonic)
+
+
+def task_definition_arn(task_definition: str) -> str:
+    """arn for 'family' (latest active revision), 'family:revision' or arn"""
+    err, out = run_cli_parsed_output(
+        ["ecs", "describe-task-definition", "--task-definition", task_definition]
+    )
+    if err:
+        raise CfutError(f"Could not find task definition {task_definition}: {err}")
+    return out["taskDefinition"]["taskDefinitionArn"]
+
+
+def family_of(task_definition_arn: str) -> str:
+    """arn:aws:ecs:...:task-definition/family:12 => family"""
+    return task_definition_arn.split("/")[-1].rsplit(":", 1)[0]
+
+
+def describe_services(cluster: str, services: List[str]) -> Dict[str, Dict]:
+    """service name => description, in batches of 10 run concurrently"""
+
+    def describe(batch: List[str]) -> List[Dict]:
+        err, out = run_cli_parsed_output(
+            ["ecs", "describe-services", "--cluster", cluster, "--services"] + batch
+        )
+        if err:
+            raise CfutError(f"Could not describe services: {err}")
+        if out["failures"]:
+            raise CfutError(f"Could not describe services: {out['failures']}")
+        return out["services"]
+
+    found = run_concurrently(describe, batches(services, DESCRIBE_BATCH_SIZE))
+    return {s["serviceName"]: s for descs in found for s in descs}
+
+
+def update_service(cluster: str, service: str, task_definition: str):
+    err, _ = run_cli_parsed_output(
+        ["ecs", "update-service", "--cluster", cluster, "--service", service]
+        + ["--task-definition", task_definition]
+    )
+    if err:
+        raise CfutError(f"Could not update service {service}: {err}")
+
+
+def rollout_state(desc: Dict, task_definition: str) -> Tuple[str, str, Tuple]:
+    """(state, detail, progress) of a service rolling out task_definition
+
+    progress changes whenever the rollout moves forward, for stall detection.
+    """
+    primary = next(d for d in desc["deployments"] if d["status"] == "PRIMARY")
+    running, desired = primary["runningCount"], primary["desiredCount"]
+    failed = primary.get("failedTasks", 0)
+    detail = f"running {running}/{desired}, pending {primary['pendingCount']}, failed {failed}"
+    progress = (primary["id"], running, primary["pendingCount"], failed)
+    if primary["taskDefinition"] != task_definition:
+        # circuit breaker created a rollback deployment to the previous revision
+        reason = primary.get("rolloutStateReason", "")
+        return STATE_FAILED, f"rolled back to {primary['taskDefinition']}. {reason}", progress
+    rollout = primary.get("rolloutState")
+    if rollout == STATE_FAILED:
+        return STATE_FAILED, f"{detail}. {primary.get('rolloutStateReason', '')}", progress
+    if rollout == STATE_COMPLETED:
+        return STATE_COMPLETED, detail, progress
+    if rollout is None and len(desc["deployments"]) == 1 and running == desired:
+        # no circuit breaker info, old style deployment
+        return STATE_COMPLETED, detail, progress
+    return STATE_IN_PROGRESS, detail, progress
+
+
+def deploy_services(
+    cluster: str,
+    services: List[str],
+    task_definition: Optional[str] = None,
+    stall_seconds: int = DEFAULT_STALL_SECONDS,
+):
+    current = describe_services(cluster, services)
+    missing = [s for s in services if s not in current]
+    if missing:
+        raise CfutError(f"Services not found in {cluster}: {', '.join(missing)}")
+
+    def target_for(service: str) -> str:
+        # by default, the latest revision of the family the service runs now
+        return task_definition_arn(task_definition or family_of(current[service]["taskDefinition"]))
+
+    targets = run_concurrently(target_for, services)
+    rollouts = [ServiceRollout(s, td) for s, td in zip(services, targets)]
+    for r in rollouts:
+        print(f"Updating {r.service} to {r.task_definition.split('/')[-1]}")
+    run_concurrently(lambda r: update_service(cluster, r.service, r.task_definition), rollouts)
+
+    started = time.monotonic()
+    active = list(rollouts)
+    while active:
+        time.sleep(POLL_INTERVAL)
+        descs = describe_services(cluster, [r.service for r in active])
+        now = time.monotonic()
+        for r in active:
+            r.state, r.detail, progress = rollout_state(descs[r.service], r.task_definition)
+            if progress != r.progress:
+                r.progress, r.progressed_at = progress, now
+            elif r.state == STATE_IN_PROGRESS and now - r.progressed_at > stall_seconds:
+                r.state = STATE_FAILED
+                r.detail = f"stalled for {stall_seconds}s: {r.detail}"
+            print(f"{r.service}: {r.state} {r.detail} ({now - started:.0f}s)")
+        active = [r for r in active if r.state == STATE_IN_PROGRESS]
+
+    failed = [r for r in rollouts if r.state == STATE_FAILED]
+    if failed:
+        raise CfutError("Rollout failed: " + "; ".join(f"{r.service}: {r.detail}" for r in failed))
@@ -0,0 +1,132 @@
+"""Deleting many stacks, in dependency order and concurrently
+
+A stack that exports values can only be deleted after every stack importing
+them is gone. Stacks are deleted as soon as their importers are deleted, and
+one loop polls the status of all stacks being deleted.
+"""
+
+import time
+from typing import Dict, List, Set
+
+from cfut.commands import (
+    CfutError,
+    run_cf,
+    run_cli_parsed_output,
+    run_concurrently,
+)
+
+POLL_INTERVAL = 2
+
+
+def get_stack_ids() -> Dict[str, str]:
+    """stack name => stack id for all existing stacks"""
+    err, out = run_cli_parsed_output(["cloudformation", "describe-stacks"])
+    if err:
+        raise CfutError(f"Could not list stacks: {err}")
+    return {s["StackName"]: s["StackId"] for s in out["Stacks"]}
+
+
+def list_importers(export_name: str) -> List[str]:
+    err, out = run_cli_parsed_output(
+        ["cloudformation", "list-imports", "--export-name", export_name]
+    )
+    if err:
+        if "is not imported by any stack" in err:
+            return []
+        raise CfutError(f"Could not list imports of {export_name}: {err}")
+    return out["Imports"]
+
+
+def get_dependents(stack_ids: Dict[str, str]) -> Dict[str, Set[str]]:
+    """stack name => names of stacks importing its exports, for given stacks"""
+    err, out = run_cli_parsed_output(["cloudformation", "list-exports"])
+    if err:
+        raise CfutError(f"Could not list exports: {err}")
+    names_by_id = {v: k for k, v in stack_ids.items()}
+    exports = [
+        (names_by_id[e["ExportingStackId"]], e["Name"])
+        for e in out["Exports"]
+        if e["ExportingStackId"] in names_by_id
+    ]
+    dependents: Dict[str, Set[str]] = {name: set() for name in stack_ids}
+    importers = run_concurrently(list_importers, [export for _, export in exports])
+    for (exporter, _), imported_by in zip(exports, importers):
+        dependents[exporter].update(imported_by)
+    return dependents
+
+
+def get_delete_statuses() -> Dict[str, str]:
+    """stack id => status, for stacks being deleted or recently deleted"""
+    err, out = run_cli_parsed_output(
+        ["cloudformation", "list-stacks", "--stack-status-filter"]
+        + ["DELETE_IN_PROGRESS", "DELETE_FAILED", "DELETE_COMPLETE"]
+    )
+    if err:
+        raise CfutError(f"Could not list stacks: {err}")
+    return {s["StackId"]: s["StackStatus"] for s in out["StackSummaries"]}
+
+
+def start_delete(name: str) -> bool:
+    """submit delete-stack, False if it was refused"""
+    try:
+        run_cf(["delete-stack", "--stack-name", name])
+        return True
+    except Exception as e:
+        # e.g. termination protection or missing permissions
+        print(f"Could not delete {name}: {e}")
+        return False
+
+
+def delete_stacks(stack_names: List[str]):
+    all_ids = get_stack_ids()
+    for name in stack_names:
+        if name not in all_ids:
+            print(f"Stack {name} does not exist, skipping")
+    stack_ids = {name: all_ids[name] for name in stack_names if name in all_ids}
+    dependents = get_dependents(stack_ids)
+
+    blocking = {name: sorted(deps - stack_ids.keys()) for name, deps in dependents.items()}
+    blocking = {name: deps for name, deps in blocking.items() if deps}
+    if blocking:
+        details = "; ".join(f"{k} is imported by {', '.join(v)}" for k, v in blocking.items())
+        raise CfutError(f"Stacks outside of the teardown depend on it: {details}")
+
+    remaining = set(stack_ids)
+    deleting: Set[str] = set()
+    deleted: Set[str] = set()
+    failed: Set[str] = set()
+    started = time.monotonic()
+    while remaining or deleting:
+        ready = sorted(name for name in remaining if dependents[name] <= deleted)
+        if not ready and not deleting:
+            # dependents of the rest failed to delete
+            break
+        for name in ready:
+            print(f"Deleting {name}")
+        started_ok = run_concurrently(start_delete, ready)
+        remaining.difference_update(ready)
+        for name, ok in zip(ready, started_ok):
+            (deleting if ok else failed).add(name)
+        if not deleting:
+            continue
+
+        time.sleep(POLL_INTERVAL)
+        statuses = get_delete_statuses()
+        for name in sorted(deleting):
+            status = statuses.get(stack_ids[name], "DELETE_IN_PROGRESS")
+            if status == "DELETE_COMPLETE":
+                deleted.add(name)
+            elif status == "DELETE_FAILED":
+                failed.add(name)
+            else:
+                continue
+            deleting.discard(name)
+            print(f"{status}: {name} ({time.monotonic() - started:.0f}s)")
+        if deleting:
+            print(f"Progress: {len(deleting)} deleting, {len(remaining)} waiting")
+
+    if failed or remaining:
+        raise CfutError(
+            f"Failed to delete: {', '.join(sorted(failed))}. "
+            f"Not deleted: {', '.join(sorted(remaining)) or '-'}"
+        )
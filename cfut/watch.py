@@ -0,0 +1,183 @@
+"""Redeploy stacks when their template files change
+
+Uses inotify on Linux (through ctypes, no extra dependencies) and polls file
+modification times elsewhere. Bursts of saves are debounced, and a stack is
+only redeployed if the content hash of its template changed since the last
+deploy.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from cfut.cache import file_digest
+from cfut.commands import deploy_stack, run_cf
+from cfut.models import CfnTemplate
+
+DEBOUNCE_SECONDS = 0.5
+POLL_INTERVAL = 1.0
+
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """Reports files whose mtime or size changed"""
+
+    def __init__(self, paths: List[str]):
+        self.paths = paths
+        self.stats = {p: self._stat(p) for p in paths}
+
+    @staticmethod
+    def _stat(path: str):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def wait(self, timeout: float) -> Set[str]:
+        deadline = time.monotonic() + timeout
+        while 1:
+            changed = set()
+            for p in self.paths:
+                st = self._stat(p)
+                if st != self.stats[p]:
+                    self.stats[p] = st
+                    changed.add(p)
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+
+class InotifyWatcher:
+    """Watches the directories of the files, so that editors replacing the
+    file on save (write to temp file + rename) are noticed too"""
+
+    def __init__(self, paths: List[str]):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init()
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init failed")
+        self.paths = set(paths)
+        self.dirs: Dict[int, str] = {}
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        for d in {os.path.dirname(p) for p in paths}:
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(d), mask)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {d}")
+            self.dirs[wd] = d
+
+    def wait(self, timeout: float) -> Set[str]:
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        buf = os.read(self.fd, 64 * 1024)
+        changed = set()
+        pos = 0
+        while pos < len(buf):
+            wd, _, _, name_len = _EVENT_HEADER.unpack_from(buf, pos)
+            pos += _EVENT_HEADER.size
+            name = buf[pos : pos + name_len].rstrip(b"\0")
+            pos += name_len
+            path = os.path.join(self.dirs[wd], os.fsdecode(name))
+            if path in self.paths:
+                changed.add(path)
+        return changed
+
+
+def create_watcher(paths: List[str]):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(paths)
+
+
+class StackWatch:
+    """Deploys changed stacks one at a time in a background thread
+
+    Edits to a stack that is being deployed are queued, or with
+    cancel_in_flight=True the running update is cancelled first.
+    """
+
+    def __init__(self, stacks: Dict[str, CfnTemplate], cancel_in_flight: bool = False):
+        self.stacks = stacks
+        self.cancel_in_flight = cancel_in_flight
+        self.deployed_hashes = {alias: file_digest(s.path) for alias, s in stacks.items()}
+        self.pending: List[str] = []
+        self.in_flight: Optional[str] = None
+        self.cond = threading.Condition()
+
+    def aliases_for(self, paths: Set[str]) -> List[str]:
+        return [alias for alias, s in self.stacks.items() if os.path.abspath(s.path) in paths]
+
+    def changed(self, aliases: List[str]):
+        with self.cond:
+            for alias in aliases:
+                if alias == self.in_flight and self.cancel_in_flight:
+                    print(f"Cancelling in-flight update of {alias}")
+                    try:
+                        run_cf(["cancel-update-stack", "--stack-name", self.stacks[alias].name])
+                    except Exception as e:
+                        # not in UPDATE_IN_PROGRESS: creating, not submitted yet or no updates
+                        print(f"Could not cancel {alias}, queueing: {e}")
+                if alias not in self.pending:
+                    self.pending.append(alias)
+            self.cond.notify()
+
+    def deploy_loop(self):
+        while 1:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+                alias = self.pending.pop(0)
+                try:
+                    digest = file_digest(self.stacks[alias].path)
+                except OSError:
+                    # file is being replaced, a new event will follow
+                    continue
+                if digest == self.deployed_hashes[alias]:
+                    continue
+                self.in_flight = alias
+            ok = False
+            try:
+                deploy_stack(self.stacks[alias])
+                ok = True
+            except Exception as e:
+                print(f"Deploy of {alias} failed: {e}")
+            finally:
+                with self.cond:
+                    self.in_flight = None
+                    # failed deploys are retried on the next save, even with same content
+                    if ok:
+                        self.deployed_hashes[alias] = digest
+            print("Watching for changes...")
+
+    def run(self):
+        paths = sorted({os.path.abspath(s.path) for s in self.stacks.values()})
+        watcher = create_watcher(paths)
+        threading.Thread(target=self.deploy_loop, daemon=True).start()
+        print(f"Watching {len(paths)} templates ({type(watcher).__name__})")
+        while 1:
+            changed = watcher.wait(3600)
+            if not changed:
+                continue
+            # debounce: collect until files have been quiet for a while
+            while 1:
+                more = watcher.wait(DEBOUNCE_SECONDS)
+                if not more:
+                    break
+                changed |= more
+            self.changed(self.aliases_for(changed))
@@ -0,0 +1,104 @@
+"""Local index of physical resource id => owning stack
+
+The index covers stacks configured in cfut.json. Refreshing it reads the
+update time of all stacks with one describe-stacks call, and lists resources
+only for stacks that changed since the last refresh.
+"""
+
+import bisect
+from dataclasses import dataclass
+from typing import Dict, List, Mapping
+
+from cfut.cache import load_json, save_json
+from cfut.commands import CfutError, run_cli_parsed_output, run_concurrently
+from cfut.models import CfnTemplate
+
+INDEX_FILE = "resources.json"
+
+
+@dataclass
+class ResourceOwner:
+    physical_id: str
+    alias: str
+    stack: str
+    logical_id: str
+    type: str
+
+
+def get_stack_update_times() -> Dict[str, str]:
+    """stack name => LastUpdatedTime (or CreationTime) for all stacks"""
+    err, out = run_cli_parsed_output(["cloudformation", "describe-stacks"])
+    if err:
+        raise CfutError(f"Could not list stacks: {err}")
+    return {s["StackName"]: s.get("LastUpdatedTime") or s["CreationTime"] for s in out["Stacks"]}
+
+
+def list_stack_resources(stack_name: str) -> List[List[str]]:
+    """[physical id, logical id, type] for every resource of stack"""
+    err, out = run_cli_parsed_output(
+        ["cloudformation", "list-stack-resources", "--stack-name", stack_name]
+    )
+    if err:
+        raise CfutError(f"Could not list resources of {stack_name}: {err}")
+    return [
+        [r["PhysicalResourceId"], r["LogicalResourceId"], r["ResourceType"]]
+        for r in out["StackResourceSummaries"]
+        if r.get("PhysicalResourceId")
+    ]
+
+
+def refresh_index(templates: Mapping[str, CfnTemplate]) -> Dict:
+    index = load_json(INDEX_FILE, {"stacks": {}})
+    times = get_stack_update_times()
+    configured = {t.name: alias for alias, t in templates.items() if t.name in times}
+    known = index["stacks"]
+    for name in list(known):
+        if name not in configured:
+            del known[name]
+
+    stale = [name for name in configured if known.get(name, {}).get("updated") != times[name]]
+    print(f"Indexing {len(stale)} changed stacks of {len(configured)}")
+    for name, resources in zip(stale, run_concurrently(list_stack_resources, stale)):
+        known[name] = {"alias": configured[name], "updated": times[name], "resources": resources}
+
+    save_json(INDEX_FILE, index)
+    return index
+
+
+class ResourceIndex:
+    def __init__(self, index: Dict):
+        self.owners = sorted(
+            (
+                ResourceOwner(physical, entry["alias"], stack, logical, typ)
+                for stack, entry in index["stacks"].items()
+                for physical, logical, typ in entry["resources"]
+            ),
+            key=lambda o: o.physical_id,
+        )
+        self.keys = [o.physical_id for o in self.owners]
+
+    def exact(self, physical_id: str) -> List[ResourceOwner]:
+        return self.prefix(physical_id, exact=True)
+
+    def prefix(self, prefix: str, exact: bool = False) -> List[ResourceOwner]:
+        found = []
+        i = bisect.bisect_left(self.keys, prefix)
+        while i < len(self.keys) and self.keys[i].startswith(prefix):
+            if not exact or self.keys[i] == prefix:
+                found.append(self.owners[i])
+            i += 1
+        return found
+
+    def substring(self, part: str) -> List[ResourceOwner]:
+        return [o for o in self.owners if part in o.physical_id]
+
+    def lookup(self, query: str) -> List[ResourceOwner]:
+        """exact matches, or prefix matches, or substring matches"""
+        return self.exact(query) or self.prefix(query) or self.substring(query)
+
+
+def load_index(templates: Mapping[str, CfnTemplate], refresh: bool = False) -> ResourceIndex:
+    index = load_json(INDEX_FILE)
+    if refresh or index is None:
+        index = refresh_index(templates)
+    return ResourceIndex(index)
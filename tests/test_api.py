@@ -0,0 +1,69 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from cfut import api, cache, commands, preflight
+from cfut.commands import CfutError
+from cfut.models import load_inifile
+
+
+def test_log_events_paginates(monkeypatch):
+    pages = {
+        None: {"events": [{"timestamp": 1, "message": "a"}], "nextForwardToken": "t1"},
+        "t1": {"events": [{"timestamp": 2, "message": "b"}], "nextForwardToken": "t2"},
+        "t2": {"events": [], "nextForwardToken": "t2"},
+    }
+
+    def fake_cli(args):
+        token = args[args.index("--next-token") + 1] if "--next-token" in args else None
+        return None, pages[token]
+
+    monkeypatch.setattr(api, "run_cli_parsed_output", fake_cli)
+    events = list(api.log_events("group", "stream"))
+    assert [e.message for e in events] == ["a", "b"]
+    assert [e.message for e in api.log_events("group", "stream", tail=True)] == ["a"]
+    events = asyncio.run(api.log_events_async("group", "stream", limit=1))
+    assert events == [api.LogEvent(1, "stream", "a")]
+
+
+def test_missing_config_raises(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(commands, "current_config", None)
+    with pytest.raises(CfutError, match="cfut.json' not found"):
+        api.stack_statuses()
+
+    monkeypatch.setattr(commands, "current_config", load_inifile('{"templates": {}}'))
+    with pytest.raises(CfutError, match="no 'ecr' section"):
+        api.ecr_images()
+    with pytest.raises(CfutError, match="no 'logs'"):
+        list(api.log_events())
+
+
+def test_configure_from_another_directory(tmp_path, monkeypatch):
+    workspace = tmp_path / "ws"
+    (workspace / "templates").mkdir(parents=True)
+    (workspace / "templates" / "a.yml").write_text("a")
+    config = {"templates": {"a": {"name": "a-stack", "path": "templates/a.yml"}}}
+    (workspace / "cfut.json").write_text(json.dumps(config))
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    monkeypatch.chdir(elsewhere)
+    monkeypatch.setattr(commands, "current_config", None)
+    monkeypatch.setattr(cache, "CACHE_DIR", cache.CACHE_DIR)
+    monkeypatch.setattr(commands, "current_profile", commands.current_profile)
+
+    validated = []
+    monkeypatch.setattr(
+        preflight,
+        "validate_template",
+        lambda path: validated.append(path) or {"parameters": {}, "capabilities": []},
+    )
+    api.configure("../ws/cfut.json", profile="dev")
+    stack = commands.lookup_stack("a")
+    assert os.path.isfile(stack.path)
+    preflight.validate_stacks([stack])
+    assert validated == [stack.path]
+    assert (workspace / ".cfut" / preflight.VALIDATIONS_FILE).exists()
+    assert os.listdir(elsewhere) == []
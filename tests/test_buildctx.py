@@ -0,0 +1,23 @@
+from cfut import buildctx
+
+
+def test_context_honors_dockerignore(tmp_path):
+    (tmp_path / "Dockerfile").write_text("FROM scratch\n")
+    dockerignore = "Dockerfile\n*.log\nnode_modules\n**/*.tmp\n!keep.log\n"
+    (tmp_path / ".dockerignore").write_text(dockerignore)
+    (tmp_path / "app.py").write_text("print(1)\n")
+    (tmp_path / "debug.log").write_text("x")
+    (tmp_path / "keep.log").write_text("x")
+    (tmp_path / "node_modules").mkdir()
+    (tmp_path / "node_modules" / "dep.js").write_text("x")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "a.tmp").write_text("x")
+
+    src = str(tmp_path)
+    assert buildctx.context_files(src) == [".dockerignore", "Dockerfile", "app.py", "keep.log"]
+
+    before = buildctx.context_hash(src)
+    (tmp_path / "debug.log").write_text("changed")
+    assert buildctx.context_hash(src) == before
+    (tmp_path / "app.py").write_text("print(2)\n")
+    assert buildctx.context_hash(src) != before
@@ -0,0 +1,76 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+from cfut import cli, completion
+
+
+def test_commands_match_parser():
+    cli.create_parser()
+    assert set(completion.COMMANDS) == set(cli._subparsers.choices)
+
+
+def test_candidates(tmp_path, monkeypatch):
+    (tmp_path / "cfut.json").write_text(json.dumps({"templates": {"a": {}, "b": {}}}))
+    (tmp_path / ".cfut").mkdir()
+    (tmp_path / ".cfut" / "completion.json").write_text(
+        json.dumps({"stacks": ["a", "app-prod"], "repos": ["web"], "families": ["job"]})
+    )
+    monkeypatch.setattr(completion, "start_refresh", lambda root: pytest_fail())
+    root = str(tmp_path)
+
+    def complete(line):
+        return completion.candidates(completion.split_line(line), root)
+
+    assert complete("cfut upd") == ["update"]
+    assert complete("cfut -p dev de") == ["describe", "delete", "deploy"]
+    assert complete("cfut update ") == ["a", "b", "app-prod"]
+    assert complete("cfut deploy a ap") == ["app-prod"]
+    assert complete("cfut tdrun ") == ["job"]
+    assert complete("cfut svcdeploy --taskdef j") == ["job"]
+    assert complete("cfut -d ecr.repo=w") == ["web"]
+    assert complete("cfut lint ") == []
+
+
+def test_stale_cache_starts_refresh(tmp_path, monkeypatch):
+    (tmp_path / "cfut.json").write_text("{}")
+    started = []
+    monkeypatch.setattr(completion, "start_refresh", started.append)
+    assert completion.candidates(["update", ""], str(tmp_path)) == []
+    assert started == [str(tmp_path)]
+
+    cache = tmp_path / ".cfut" / "completion.json"
+    cache.parent.mkdir()
+    cache.write_text(json.dumps({"stacks": ["x"]}))
+    old = time.time() - completion.CACHE_TTL - 1
+    os.utime(cache, (old, old))
+    assert completion.candidates(["update", ""], str(tmp_path)) == ["x"]
+    assert len(started) == 2
+
+
+def test_completion_imports_little():
+    code = "import sys, cfut.completion; print('yaml' in sys.modules, 'argparse' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ["False", "False"]
+
+
+def pytest_fail():
+    raise AssertionError("refresh started with a fresh cache")
+
+
+def test_completion_script_outside_workspace(tmp_path):
+    code = "import sys, cfut.completion as c; sys.argv[1:] = ['completion', 'bash']; c.entry()"
+    env = {**os.environ, "PYTHONPATH": os.path.dirname(os.path.dirname(completion.__file__))}
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=tmp_path,
+        env=env,
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert out.stdout.strip() == completion.SCRIPTS["bash"]
+    assert os.listdir(tmp_path) == []
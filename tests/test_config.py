@@ -0,0 +1,70 @@
+import json
+import os
+from dataclasses import dataclass
+from typing import List, Optional
+
+import pytest
+
+from cfut.dataclass_argparse import apply_config_overrides, coerce_value
+from cfut.models import Capability, dump_inifile, load_inifile, read_inifile
+
+CONFIG = {
+    "profile": "dev",
+    "ecr": {"repo": "web", "obsolete": 1},
+    "templates": {
+        "a": {"name": "a-stack", "path": "a.yml", "capabilities": ["CAPABILITY_IAM"]},
+        "broken": {"path": "b.yml"},
+    },
+}
+
+
+def test_templates_are_built_on_access():
+    config = load_inifile(json.dumps(CONFIG))
+    assert list(config.templates) == ["a", "broken"]
+    assert "broken" in config.templates
+    a = config.templates["a"]
+    assert a.capabilities == [Capability.CAPABILITY_IAM]
+    assert config.templates["a"] is a
+    assert config.templates.get("nope") is None
+    with pytest.raises(ValueError, match="Bad template 'broken'"):
+        config.templates["broken"]
+
+
+def test_dump_roundtrip():
+    config = load_inifile(json.dumps({"templates": {"a": CONFIG["templates"]["a"]}}))
+    dumped = json.loads(dump_inifile(config))
+    assert dumped["templates"]["a"]["capabilities"] == ["CAPABILITY_IAM"]
+    assert load_inifile(json.dumps(dumped)).templates["a"] == config.templates["a"]
+
+
+def test_read_inifile_writes_nothing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "cfut.json").write_text(json.dumps(CONFIG))
+    tmp_path.chmod(0o500)
+    try:
+        assert read_inifile("cfut.json").ecr.repo == "web"
+    finally:
+        tmp_path.chmod(0o700)
+    assert os.listdir(tmp_path) == ["cfut.json"]
+
+
+def test_overrides_are_coerced():
+    config = load_inifile(json.dumps(CONFIG))
+    apply_config_overrides(config, ["ecr.tag=v2", "ecr.account=null", "profile=prod"])
+    assert (config.ecr.tag, config.ecr.account, config.profile) == ("v2", None, "prod")
+    assert coerce_value(Optional[List[Capability]], "CAPABILITY_IAM") == [Capability.CAPABILITY_IAM]
+    assert coerce_value(bool, "yes") is True
+    with pytest.raises(ValueError, match="no such field 'rep'"):
+        apply_config_overrides(config, ["ecr.rep=x"])
+    with pytest.raises(ValueError, match="'ecs' is not configured"):
+        apply_config_overrides(config, ["ecs.cluster=x"])
+
+    @dataclass
+    class Limits:
+        retries: int = 1
+
+    limits = Limits()
+    apply_config_overrides(limits, ["retries=3"])
+    assert limits.retries == 3
+    with pytest.raises(ValueError, match="Bad value for retries"):
+        apply_config_overrides(limits, ["retries=x"])
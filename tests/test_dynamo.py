@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from cfut import dynamo
+
+
+def test_to_item():
+    item = dynamo.to_item({"id": "a", "n": 3, "ok": True, "tags": ["x"], "m": {"z": None}})
+    assert item == {
+        "id": {"S": "a"},
+        "n": {"N": "3"},
+        "ok": {"BOOL": True},
+        "tags": {"L": [{"S": "x"}]},
+        "m": {"M": {"z": {"NULL": True}}},
+    }
+
+
+def test_read_items_jsonl(tmp_path):
+    f = tmp_path / "items.jsonl"
+    f.write_text("\n".join(json.dumps({"id": i}) for i in range(3)) + "\n")
+    assert [it["id"] for it in dynamo.read_items(str(f))] == [0, 1, 2]
+
+
+def test_load_table_retries_unprocessed(monkeypatch):
+    monkeypatch.setattr(dynamo, "BACKOFF_BASE", 0)
+    seen = []
+
+    def write(request):
+        [(table, reqs)] = request.items()
+        seen.append(len(reqs))
+        # leave the last request unprocessed on first try of each batch
+        if len(reqs) > 1 and len(seen) % 2:
+            return {table: reqs[-1:]}
+        return {}
+
+    count = dynamo.load_table("t", ({"id": i} for i in range(60)), workers=1, write=write)
+    assert count == 60
+    assert sum(seen) == 60 + 3
+    assert max(seen) == dynamo.BATCH_SIZE
+
+
+def test_ddump_output_loads_back(tmp_path):
+    scanned = {
+        "id": {"N": "42"},
+        "price": {"N": "9.5"},
+        "name": {"S": "3"},
+        "blob": {"B": "AAE="},
+        "blobs": {"BS": ["AAE=", "AgM="]},
+        "big": {"N": "12345678901234567890.123456789"},
+        "tags": {"SS": ["a", "b"]},
+        "sizes": {"NS": ["1", "2"]},
+        "nested": {"M": {"l": {"L": [{"N": "1"}, {"S": "x"}, {"NULL": True}]}}},
+        "ok": {"BOOL": False},
+    }
+    f = tmp_path / "dump.yml"
+    # as printed by 'cfut ddump'
+    f.write_text(dynamo.dump_items([dynamo.from_item(scanned)]))
+    [item] = dynamo.read_items(str(f))
+    assert item["id"] == 42 and item["nested"] == {"l": [1, "x", None]}
+    assert dynamo.to_item(item) == scanned
+
+
+def test_sets_must_be_uniform_and_non_empty():
+    with pytest.raises(ValueError, match="empty set"):
+        dynamo.to_attribute(set())
+    with pytest.raises(ValueError, match="all strings"):
+        dynamo.to_attribute({1, "a"})
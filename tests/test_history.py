@@ -0,0 +1,75 @@
+import sqlite3
+from contextlib import closing
+
+from cfut import commands, history
+from cfut.models import StatusRules
+
+
+def test_resource_timings():
+    events = [
+        {
+            "Timestamp": "2024-01-01T00:01:40+00:00",
+            "LogicalResourceId": "Bucket",
+            "ResourceType": "AWS::S3::Bucket",
+            "ResourceStatus": "UPDATE_COMPLETE",
+        },
+        {
+            "Timestamp": "2024-01-01T00:01:10+00:00",
+            "LogicalResourceId": "Queue",
+            "ResourceType": "AWS::SQS::Queue",
+            "ResourceStatus": "UPDATE_IN_PROGRESS",
+        },
+        {
+            "Timestamp": "2024-01-01T00:01:00+00:00",
+            "LogicalResourceId": "Bucket",
+            "ResourceType": "AWS::S3::Bucket",
+            "ResourceStatus": "UPDATE_IN_PROGRESS",
+        },
+        {
+            "Timestamp": "2024-01-01T00:00:50+00:00",
+            "LogicalResourceId": "st",
+            "ResourceType": "AWS::CloudFormation::Stack",
+            "ResourceStatus": "UPDATE_IN_PROGRESS",
+        },
+    ]
+    since = history.parse_timestamp("2024-01-01T00:00:00+00:00")
+    timings = {t[0]: t for t in history.resource_timings(events, "st", since)}
+    assert set(timings) == {"Bucket", "Queue"}
+    assert timings["Bucket"][3] - timings["Bucket"][2] == 40
+    assert timings["Queue"][3] is None
+
+
+def test_stats_and_estimates(tmp_path):
+    with closing(history.connect(str(tmp_path / "h.db"))) as conn:
+        for i, d in enumerate([10, 20, 30, 40, 100]):
+            history.record_deploy(
+                conn,
+                "st",
+                "UPDATE",
+                i * 1000,
+                i * 1000 + d,
+                "UPDATE_COMPLETE",
+                True,
+                [("Bucket", "AWS::S3::Bucket", i * 1000, i * 1000 + d / 2)],
+            )
+        history.record_deploy(
+            conn, "st", "UPDATE", 9000, 9999, "UPDATE_ROLLBACK_COMPLETE", False, []
+        )
+        assert history.expected_duration(conn, "st", "UPDATE") == 30
+        assert history.resource_baselines(conn, "st", "UPDATE") == {"Bucket": 15}
+        assert history.deploy_stats(conn) == [("st", "UPDATE", 5, 30, 100)]
+
+
+def test_unusable_history_does_not_fail_deploy(monkeypatch, capsys):
+    def broken(path=None):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(history, "connect", broken)
+    monkeypatch.setattr(commands, "get_stack_status", lambda name: "UPDATE_COMPLETE")
+    monkeypatch.setattr(commands, "get_stack_events", lambda name: [])
+    monkeypatch.setattr(commands, "forget_stack_outputs", lambda name: None)
+    commands.poll_until_status("st", StatusRules("UPDATE_IN_PROGRESS", "UPDATE_COMPLETE"))
+    out, err = capsys.readouterr()
+    assert "Complete: UPDATE_COMPLETE" in out
+    assert "Could not read deploy history: database is locked" in err
+    assert "Could not record deploy history: database is locked" in err
@@ -0,0 +1,65 @@
+import os
+import re
+
+from cfut import logarchive
+
+
+def test_sync_resumes_and_grep(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pages = {
+        None: {"events": [{"timestamp": 1000, "message": "ERROR boom"}], "nextForwardToken": "f1"},
+        "f1": {"events": [{"timestamp": 2000, "message": "ok"}], "nextForwardToken": "f2"},
+        "f2": {"events": [], "nextForwardToken": "f2"},
+    }
+    calls = []
+
+    def fake_cli(cmd):
+        calls.append(cmd)
+        if "describe-log-streams" in cmd:
+            return None, {
+                "logStreams": [
+                    {"logStreamName": "s1", "lastEventTimestamp": 2000, "lastIngestionTime": 2000}
+                ]
+            }
+        token = cmd[cmd.index("--next-token") + 1] if "--next-token" in cmd else None
+        return None, pages[token]
+
+    monkeypatch.setattr(logarchive, "run_cli_parsed_output", fake_cli)
+    archive = logarchive.LogArchive("/aws/lambda/fn")
+    assert archive.sync(0) == 2
+    assert logarchive.LogArchive("/aws/lambda/fn").sync(0) == 0
+
+    archive = logarchive.LogArchive("/aws/lambda/fn")
+    assert archive.grep("ERR") == [[1000, "s1", "ERROR boom"]]
+    assert archive.grep("^ok$") == [[2000, "s1", "ok"]]
+    assert archive.grep("ERR", since_ms=1500) == []
+
+    archive.max_bytes = 0
+    archive.evict()
+    assert archive.index["segments"] == []
+    assert not [f for f in os.listdir(archive.dir) if f.startswith("seg-")]
+
+
+def test_grep_matches_through_json_escaping(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    archive = logarchive.LogArchive("/aws/lambda/fn")
+    messages = ['key"value', "tab\there", "a\\b", "line\nbreak", "def", "xABCx", "ad"]
+    archive.write_segment([[i, "s1", m] for i, m in enumerate(messages)])
+    assert [e[2] for e in archive.grep("key.value")] == ['key"value']
+    assert [e[2] for e in archive.grep("tab.here")] == ["tab\there"]
+    assert [e[2] for e in archive.grep(r"a\\b")] == ["a\\b"]
+    assert [e[2] for e in archive.grep("line[^x]break")] == ["line\nbreak"]
+    assert archive.grep("nothing") == []
+    for pattern in [
+        "(abc)?def",
+        "(foo)*def",
+        "a(bc){0,1}d",
+        r"\x41BC",
+        r"\u0041BC",
+        r"\N{LATIN CAPITAL LETTER A}BC",
+        r"\101BC",
+    ]:
+        found = [e[2] for e in archive.grep(pattern)]
+        assert found and all(re.search(pattern, m) for m in found), pattern
+    assert logarchive.literal_hint(r"x{2,3}err\.log|y") == ""
+    assert logarchive.literal_hint(r"x{2,3}err\.log?") == "err.lo"
@@ -0,0 +1,38 @@
+from cfut import monitor
+from cfut.history import parse_timestamp
+
+
+def stack(name, status, updated="2024-01-01T00:00:00+00:00"):
+    return {"StackName": name, "StackStatus": status, "CreationTime": updated}
+
+
+def test_event_tails_rotate_over_active_stacks(monkeypatch):
+    monkeypatch.setattr(monitor, "MAX_EVENT_TAILS", 2)
+    m = monitor.Monitor()
+    stacks = {f"s{i}": stack(f"s{i}", "UPDATE_IN_PROGRESS") for i in range(3)}
+    stacks["done"] = stack("done", "UPDATE_COMPLETE")
+    assert m.update(stacks) == ["s0", "s1"]
+    assert m.update(stacks) == ["s2", "s0"]
+    stacks["s1"] = stack("s1", "UPDATE_COMPLETE")
+    assert m.update(stacks) == ["s2", "s0"]
+    assert list(m.rows) == ["done", "s0", "s1", "s2"]
+
+
+def test_rows(monkeypatch):
+    m = monitor.Monitor(["app", "gone", "new"])
+    m.update(
+        {
+            "app": stack("app", "UPDATE_IN_PROGRESS", "2024-01-01T00:00:00+00:00"),
+            "gone": stack("gone", "DELETE_IN_PROGRESS"),
+        }
+    )
+    m.rows["app"].event = "Bucket UPDATE_IN_PROGRESS"
+    now = parse_timestamp("2024-01-01T00:01:05+00:00")
+    header, app, gone, new = m.format_rows(now)
+    assert app.split() == ["app", "UPDATE_IN_PROGRESS", "1:05", "Bucket", "UPDATE_IN_PROGRESS"]
+    assert new.split() == ["new", "NOT_EXIST"]
+
+    assert m.update({"app": stack("app", "UPDATE_COMPLETE")}) == []
+    assert m.rows["gone"].status == "DELETE_COMPLETE"
+    assert m.rows["app"].event == ""
+    assert m.format_rows(now)[1].split() == ["app", "UPDATE_COMPLETE"]
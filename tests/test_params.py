@@ -0,0 +1,55 @@
+import pytest
+
+from cfut.models import CfnTemplate
+from cfut.params import (
+    LocalParameterStore,
+    ParamRef,
+    collect_refs,
+    parse_param_value,
+    resolve_parameters,
+    split_output_ref,
+)
+
+
+def test_parse_param_value():
+    assert parse_param_value("x") == "x"
+    assert parse_param_value(12) == "12"
+    assert parse_param_value({"ref": "network.VpcId"}) == ParamRef("ref", "network.VpcId")
+    with pytest.raises(ValueError):
+        parse_param_value({"nope": "x"})
+
+
+def test_collect_and_resolve():
+    stacks = [
+        CfnTemplate("a", "a.yml", parameters={"Vpc": {"ref": "net.VpcId"}, "Env": "dev"}),
+        CfnTemplate("b", "b.yml", parameters={"Vpc": {"ref": "net.VpcId"}}),
+    ]
+    refs = collect_refs(stacks)
+    assert refs == {ParamRef("ref", "net.VpcId")}
+
+    templates = {"net": CfnTemplate("network-stack", "net.yml")}
+    assert split_output_ref(ParamRef("ref", "net.VpcId"), templates) == ("network-stack", "VpcId")
+    assert split_output_ref(ParamRef("ref", "other.X"), templates) == ("other", "X")
+
+    resolved = resolve_parameters(stacks[0].parameters, {ParamRef("ref", "net.VpcId"): "vpc-1"})
+    assert resolved == {"Vpc": "vpc-1", "Env": "dev"}
+
+
+def test_store_values_batched_and_cached():
+    from cfut import commands
+
+    names = [f"/app/p{i}" for i in range(12)]
+    store = LocalParameterStore(
+        ssm={n: n.upper() for n in names},
+        secrets={"db-password": "hunter2"},
+        secure_ssm=["/app/p0"],
+    )
+    commands.set_parameter_store(store)
+    refs = [ParamRef("ssm", n) for n in names] + [ParamRef("secret", "db-password")]
+    commands.fetch_store_values(refs)
+    commands.fetch_store_values(refs)
+
+    assert sorted(len(names) for _, names in store.calls) == [1, 2, 10]
+    assert commands.param_values_memo[ParamRef("ssm", "/app/p3")] == "/APP/P3"
+    assert commands.redact("x hunter2 /APP/P0 /APP/P1") == "x **** **** /APP/P1"
+    commands.set_parameter_store(commands.AwsParameterStore())
@@ -0,0 +1,55 @@
+import pytest
+
+from cfut import preflight
+from cfut.commands import CfutError
+from cfut.models import Capability, CfnTemplate
+
+
+def test_validate_stacks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.yml").write_text("a")
+    (tmp_path / "b.yml").write_text("b")
+    summaries = {
+        "a.yml": {"parameters": {"Env": False, "Size": True}, "capabilities": []},
+        "b.yml": {"parameters": {}, "capabilities": ["CAPABILITY_IAM"]},
+    }
+    validated = []
+
+    def validate_template(path):
+        validated.append(path)
+        return summaries[path]
+
+    monkeypatch.setattr(preflight, "validate_template", validate_template)
+    a = CfnTemplate("a-stack", "a.yml", parameters={"Env": "dev"})
+    a2 = CfnTemplate("a2-stack", "a.yml", parameters={"Env": {"ssm": "/env"}, "Size": "1"})
+    b = CfnTemplate("b-stack", "b.yml", capabilities=[Capability.CAPABILITY_NAMED_IAM])
+    preflight.validate_stacks([a, a2, b])
+    assert validated == ["a.yml", "b.yml"]
+
+    # unchanged templates come from cache
+    bad = CfnTemplate("bad-stack", "a.yml", parameters={"Typo": "x"})
+    with pytest.raises(CfutError) as e:
+        preflight.validate_stacks([a, bad, CfnTemplate("c", "b.yml")])
+    assert validated == ["a.yml", "b.yml"]
+    msg = str(e.value)
+    assert "bad-stack (a.yml): parameters not in template: Typo" in msg
+    assert "bad-stack (a.yml): parameters without value: Env" in msg
+    assert "c (b.yml): capabilities needed: CAPABILITY_IAM" in msg
+    assert "a-stack" not in msg
+
+    (tmp_path / "b.yml").write_text("changed")
+    preflight.validate_stacks([b])
+    assert validated == ["a.yml", "b.yml", "b.yml"]
+
+
+def test_validation_errors_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.yml").write_text("a")
+
+    def validate_template(path):
+        raise CfutError(f"{path}: Template format error")
+
+    monkeypatch.setattr(preflight, "validate_template", validate_template)
+    with pytest.raises(CfutError, match="a.yml: Template format error"):
+        preflight.validate_stacks([CfnTemplate("a", "a.yml")])
+    assert not (tmp_path / ".cfut" / preflight.VALIDATIONS_FILE).exists()
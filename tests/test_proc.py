@@ -0,0 +1,10 @@
+from cfut import proc
+
+
+def test_missing_executable_fails_like_a_shell(capsys):
+    ret = proc.run(["cfut-no-such-command", "x"])
+    assert (ret.returncode, ret.stderr) == (127, "cfut-no-such-command: command not found")
+    assert proc.run(["cfut-no-such-command"], capture=False).returncode == 127
+    assert proc.run_pipe(["cfut-no-such-command"], ["cat"]) == 127
+    assert proc.run_pipe(["echo", "hi"], ["cfut-no-such-command"]) == 127
+    assert capsys.readouterr().err.count("command not found") == 3
@@ -0,0 +1,41 @@
+from cfut import svcdeploy
+
+TD1 = "arn:aws:ecs:eu-west-1:1:task-definition/app:1"
+TD2 = "arn:aws:ecs:eu-west-1:1:task-definition/app:2"
+
+
+def deployment(td, status="PRIMARY", rollout="IN_PROGRESS", running=1, **kw):
+    d = {
+        "id": "ecs-svc/" + td[-1],
+        "status": status,
+        "taskDefinition": td,
+        "runningCount": running,
+        "desiredCount": 2,
+        "pendingCount": 0,
+        "failedTasks": 0,
+        "rolloutState": rollout,
+    }
+    d.update(kw)
+    return d
+
+
+def test_rollout_state():
+    assert svcdeploy.family_of(TD2) == "app"
+
+    state, _, _ = svcdeploy.rollout_state({"deployments": [deployment(TD2)]}, TD2)
+    assert state == svcdeploy.STATE_IN_PROGRESS
+
+    done = {"deployments": [deployment(TD2, rollout="COMPLETED", running=2)]}
+    assert svcdeploy.rollout_state(done, TD2)[0] == svcdeploy.STATE_COMPLETED
+
+    failed = {
+        "deployments": [
+            deployment(TD2, rollout="FAILED", failedTasks=3, rolloutStateReason="circuit breaker")
+        ]
+    }
+    state, detail, _ = svcdeploy.rollout_state(failed, TD2)
+    assert state == svcdeploy.STATE_FAILED and "failed 3" in detail
+
+    rolled_back = {"deployments": [deployment(TD1), deployment(TD2, status="ACTIVE")]}
+    state, detail, _ = svcdeploy.rollout_state(rolled_back, TD2)
+    assert state == svcdeploy.STATE_FAILED and "rolled back" in detail
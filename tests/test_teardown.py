@@ -0,0 +1,50 @@
+import pytest
+
+from cfut import teardown
+from cfut.commands import CfutError
+
+
+def test_delete_stacks_in_dependency_order(monkeypatch):
+    # app imports from net, net imports from base; logs is independent
+    ids = {n: "id-" + n for n in ["base", "net", "app", "logs"]}
+    dependents = {"base": {"net"}, "net": {"app"}, "app": set(), "logs": set()}
+    issued = []
+    statuses = {}
+
+    def delete(cmd):
+        name = cmd[-1]
+        issued.append(name)
+        statuses["id-" + name] = "DELETE_COMPLETE"
+
+    monkeypatch.setattr(teardown, "POLL_INTERVAL", 0)
+    monkeypatch.setattr(teardown, "get_stack_ids", lambda: ids)
+    monkeypatch.setattr(teardown, "get_dependents", lambda stack_ids: dependents)
+    monkeypatch.setattr(teardown, "run_cf", delete)
+    monkeypatch.setattr(teardown, "get_delete_statuses", lambda: dict(statuses))
+
+    teardown.delete_stacks(["base", "net", "app", "logs"])
+    assert sorted(issued[:2]) == ["app", "logs"]
+    assert issued[2:] == ["net", "base"]
+
+
+def test_refused_delete_is_reported_with_the_rest(monkeypatch):
+    ids = {n: "id-" + n for n in ["net", "app", "logs"]}
+    dependents = {"net": {"app"}, "app": set(), "logs": set()}
+    statuses = {}
+
+    def delete(cmd):
+        name = cmd[-1]
+        if name == "app":
+            raise Exception("Stack cannot be deleted while TerminationProtection is enabled")
+        statuses["id-" + name] = "DELETE_COMPLETE"
+
+    monkeypatch.setattr(teardown, "POLL_INTERVAL", 0)
+    monkeypatch.setattr(teardown, "get_stack_ids", lambda: ids)
+    monkeypatch.setattr(teardown, "get_dependents", lambda stack_ids: dependents)
+    monkeypatch.setattr(teardown, "run_cf", delete)
+    monkeypatch.setattr(teardown, "get_delete_statuses", lambda: dict(statuses))
+
+    with pytest.raises(CfutError) as e:
+        teardown.delete_stacks(["net", "app", "logs"])
+    assert str(e.value) == "Failed to delete: app. Not deleted: net"
+    assert statuses == {"id-logs": "DELETE_COMPLETE"}
@@ -0,0 +1,57 @@
+import os
+import threading
+import time
+
+from cfut import watch
+from cfut.models import CfnTemplate
+
+
+def test_watchers_report_changed_file(tmp_path):
+    path = str(tmp_path / "t.yml")
+    open(path, "w").write("a")
+    for create in [watch.PollingWatcher, watch.create_watcher]:
+        watcher = create([path])
+        assert watcher.wait(0) == set()
+        with open(path, "w") as f:
+            f.write("changed" + str(id(watcher)))
+        os.utime(path, ns=(1, os.stat(path).st_mtime_ns + 10**9))
+        assert watcher.wait(2) == {path}
+
+
+def test_failed_cancel_queues_and_failed_deploy_is_retried(tmp_path, monkeypatch):
+    path = tmp_path / "t.yml"
+    path.write_text("a")
+    stack = CfnTemplate("st", str(path))
+    sw = watch.StackWatch({"t": stack}, cancel_in_flight=True)
+
+    def cancel(cmd):
+        raise Exception("CancelUpdateStack cannot be called from current stack status")
+
+    monkeypatch.setattr(watch, "run_cf", cancel)
+    sw.in_flight = "t"
+    sw.changed(["t"])
+    assert sw.pending == ["t"]
+    sw.in_flight = None
+
+    deployed = []
+
+    def deploy_stack(s):
+        deployed.append(s.name)
+        raise Exception("Rate exceeded")
+
+    monkeypatch.setattr(watch, "deploy_stack", deploy_stack)
+    original = sw.deployed_hashes["t"]
+    path.write_text("b")
+    threading.Thread(target=sw.deploy_loop, daemon=True).start()
+    for _ in range(100):
+        if deployed and sw.in_flight is None:
+            break
+        time.sleep(0.01)
+    assert deployed == ["st"]
+    assert sw.deployed_hashes["t"] == original
+    sw.changed(["t"])
+    for _ in range(100):
+        if len(deployed) == 2:
+            break
+        time.sleep(0.01)
+    assert deployed == ["st", "st"]
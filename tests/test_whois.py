@@ -0,0 +1,28 @@
+from cfut.whois import ResourceIndex
+
+
+def test_lookup():
+    index = ResourceIndex(
+        {
+            "stacks": {
+                "net-stack": {
+                    "alias": "net",
+                    "updated": "t",
+                    "resources": [
+                        ["sg-123", "Sg", "AWS::EC2::SecurityGroup"],
+                        ["sg-1234", "Sg2", "AWS::EC2::SecurityGroup"],
+                    ],
+                },
+                "app-stack": {
+                    "alias": "app",
+                    "updated": "t",
+                    "resources": [["my-app-bucket", "Bucket", "AWS::S3::Bucket"]],
+                },
+            }
+        }
+    )
+    assert [o.logical_id for o in index.lookup("sg-123")] == ["Sg"]
+    assert [o.logical_id for o in index.lookup("sg-12")] == ["Sg", "Sg2"]
+    [owner] = index.lookup("app-buck")
+    assert (owner.alias, owner.stack) == ("app", "app-stack")
+    assert index.lookup("nothing") == []